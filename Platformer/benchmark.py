@@ -0,0 +1,259 @@
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from classes import gamestate, scenes, entities, controllers, headless, physics, shapes
+
+
+# Synthetic scene with a large number of 20x20 walls laid out as floors with gaps,
+# and a few players dropping onto them, used to see how the engine scales with level size
+class Stress_Walls(scenes.Scene):
+    def __init__(self, game_state, wall_count, player_count=20):
+        super().__init__(game_state)
+        self.wall_count = wall_count
+        self.player_count = player_count
+
+    def setup(self):
+        scenes.clear_entities(self.game_state)
+        world = self.game_state.world
+        grid = self.game_state.GRID_SIZE
+        columns = self.game_state.WIDTH // grid
+
+        # one floor every 5 grid rows, every 4th tile left out as a gap
+        placed = 0
+        row = 0
+        while placed < self.wall_count:
+            for column in range(columns):
+                if column % 4 == 3:
+                    continue
+                entities.Wall(column * grid, (row * 5 + 3) * grid, grid, grid, color=(50, 50, 200), world=world)
+                placed += 1
+                if placed == self.wall_count:
+                    break
+            row += 1
+
+        for i in range(self.player_count):
+            entities.Player(30 + i * 35 % (self.game_state.WIDTH - 60), 10, 20, 20, color=(255, 50, 50), world=world)
+        self.player = world.bodies[-1]
+        self.game_state.character_controller = controllers.CharacterController(self.player)
+        self.game_state.world.bake()
+
+    def run_engine(self):
+        pass
+
+    def next_scene(self):
+        return None
+
+
+# Synthetic scene with a crowd of small circle players in a walled arena with a few platforms,
+# all driven at once by a controllers.CrowdController, used to see how the circle_vs_circle path
+# scales with the number of players packed together
+class Stress_Crowd(scenes.Scene):
+    def __init__(self, game_state, player_count, size=16):
+        super().__init__(game_state)
+        self.player_count = player_count
+        self.size = size
+
+    def setup(self):
+        scenes.clear_entities(self.game_state)
+        world = self.game_state.world
+        width = self.game_state.WIDTH
+        height = self.game_state.HEIGHT
+        grid = self.game_state.GRID_SIZE
+
+        # walls around the edges of the screen, and two platforms
+        entities.Wall(0, 0, width, grid, color=(50, 50, 200), world=world)
+        entities.Wall(0, 0, grid, height, color=(50, 50, 200), world=world)
+        entities.Wall(width - grid, 0, grid, height, color=(50, 50, 200), world=world)
+        entities.Wall(0, height - grid, width, grid, color=(50, 50, 200), world=world)
+        entities.Wall(width // 8, height // 2, width // 4, grid, color=(50, 50, 200), world=world)
+        entities.Wall(width * 5 // 8, height // 2, width // 4, grid, color=(50, 50, 200), world=world)
+
+        # the crowd fills the arena row by row from the top, a little apart so they drop and pile up
+        step = self.size + 4
+        columns = (width - 2 * grid) // step
+        players = []
+        for i in range(self.player_count):
+            x = grid + 2 + i % columns * step
+            y = grid + 2 + i // columns * step
+            players.append(entities.Player(x, y, self.size, self.size, color=(255, 50, 50), world=world))
+        self.player = players[0]
+        self.game_state.character_controller = CrowdAI(controllers.CrowdController(players))
+        self.game_state.world.bake()
+
+    def run_engine(self):
+        pass
+
+    def next_scene(self):
+        return None
+
+
+# CrowdAI class, the character controller of Stress_Crowd
+# The first player gets the scripted input, every other one walks back and forth and jumps now and
+# then on its own schedule, the buttons of all of them are worked out and applied as arrays
+class CrowdAI:
+    def __init__(self, crowd):
+        self.crowd = crowd
+        self.tick = 0
+        count = len(crowd.players)
+        self.offsets = controllers.np.arange(count) * 37 % 240
+
+    def set_input(self, input):
+        phase = (self.tick + self.offsets) % 240
+        right = phase < 110
+        left = (phase >= 120) & (phase < 230)
+        jump = phase % 80 == 0
+        right[0], left[0], jump[0] = input.right, input.left, input.jump
+        self.crowd.apply(left, right, jump)
+        self.tick += 1
+
+
+# scripted input, run right for a while, then left, jumping every second
+def scripted_inputs(ticks):
+    inputs = []
+    for tick in range(ticks):
+        inputs.append(controllers.Input(right=tick % 240 < 120, left=tick % 240 >= 120, jump=tick % 60 == 0))
+    return inputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the physics headless and report how fast it goes")
+    parser.add_argument("--ticks", type=int, default=600)
+    parser.add_argument("--walls", type=int, nargs="*", default=[1000, 10000, 50000])
+    parser.add_argument("--rollouts", type=int, default=0,
+                        help="also run this many Level_1 rollouts in parallel and report how they scale")
+    parser.add_argument("--broadphase", choices=["hash", "sap"], default="hash",
+                        help="find pairs with the spatial hash or the sweep and prune")
+    parser.add_argument("--store", action="store_true", help="keep the body state in a numpy BodyStore")
+    parser.add_argument("--batch", action="store_true", help="run the narrowphase in one numpy pass")
+    parser.add_argument("--crowd", type=int, nargs="*", default=[],
+                        help="also run crowds of this many players and time their circle_vs_circle contacts")
+    parser.add_argument("--allocations", action="store_true",
+                        help="also check that a populated level allocates next to nothing per tick once warmed up")
+    args = parser.parse_args()
+
+    options = dict(use_body_store=args.store, batch_narrowphase=args.batch,
+                   sweep_and_prune=args.broadphase == "sap")
+    game_state = gamestate.GameState(headless=True, **options)
+    benchmarks = [("Level_1", scenes.Level_1(game_state)), ("Level_2", scenes.Level_2(game_state))]
+    for count in args.walls:
+        benchmarks.append((f"{count} walls", Stress_Walls(game_state, count)))
+
+    inputs = scripted_inputs(args.ticks)
+    print(f"{'scene':<14}{'ticks/sec':>12}{'pairs/tick':>12}{'contacts/tick':>15}")
+    for name, scene in benchmarks:
+        stats = headless.run(scene, inputs, args.ticks)
+        print(f"{name:<14}{stats.ticks_per_second:>12.1f}{stats.pairs_per_tick:>12.1f}{stats.contacts_per_tick:>15.1f}")
+
+    if args.rollouts:
+        parallel_rollouts(args.rollouts, args.ticks, options)
+
+    if args.crowd:
+        crowds(args.crowd, args.ticks, options)
+
+    if args.allocations and not steady_allocations(args.ticks):
+        sys.exit(1)
+
+
+# run Level_1 rollouts with different input seeds on 1, 2, 4, ... worker processes
+# options are the physics options of the GameState of every rollout, see gamestate.GameState
+def parallel_rollouts(count, ticks, options):
+    input_sequences = []
+    for seed in range(count):
+        inputs = scripted_inputs(ticks)
+        input_sequences.append(inputs[seed % 240:] + inputs[:seed % 240])
+
+    print()
+    print(f"{'workers':<14}{'rollouts/sec':>12}{'ticks/sec':>12}{'mean score':>15}")
+    workers = 1
+    cores = os.cpu_count() or 1
+    while True:
+        start = time.perf_counter()
+        results = headless.run_parallel(scenes.Level_1, input_sequences, ticks, workers, options)
+        seconds = time.perf_counter() - start
+        score = sum(result.score for result in results) / count
+        print(f"{workers:<14}{count / seconds:>12.1f}{count * ticks / seconds:>12.1f}{score:>15.2f}")
+        if workers >= cores:
+            break
+        workers = min(workers * 2, cores)
+
+
+# run Stress_Crowd with each number of players, then time the narrowphase on the circle pairs of
+# the settled crowd, one circle_vs_circle call at a time and in one numpy batch
+# options are the physics options of the GameState, see gamestate.GameState
+def crowds(counts, ticks, options):
+    if controllers.np is None:
+        print()
+        print("the crowd benchmark needs numpy")
+        return
+
+    game_state = gamestate.GameState(headless=True, **options)
+    inputs = scripted_inputs(ticks)
+    print()
+    print(f"{'crowd':<14}{'ticks/sec':>12}{'pairs/tick':>12}{'contacts/tick':>15}"
+          f"{'circle pairs':>14}{'us/pair':>10}{'batch us/pair':>15}")
+    for count in counts:
+        scene = Stress_Crowd(game_state, count)
+        stats = headless.run(scene, inputs, ticks)
+
+        world = game_state.world
+        pairs = [m for m in physics.generate_collision_pairs(world.bodies, world.broadphase)
+                 if m.A.shape == shapes.CIRCLE and m.B.shape == shapes.CIRCLE]
+        start = time.perf_counter()
+        for m in pairs:
+            physics.circle_vs_circle(m)
+        scalar = (time.perf_counter() - start) / max(len(pairs), 1) * 1e6
+        start = time.perf_counter()
+        if pairs:
+            physics.find_contacts_batch(pairs)
+        batch = (time.perf_counter() - start) / max(len(pairs), 1) * 1e6
+        print(f"{count:<14}{stats.ticks_per_second:>12.1f}{stats.pairs_per_tick:>12.1f}"
+              f"{stats.contacts_per_tick:>15.1f}{len(pairs):>14}{scalar:>10.2f}{batch:>15.2f}")
+
+
+# run a populated level until the pools have grown, then trace how far the memory peaks above where
+# it was at the start of each tick after that, which is what a tick allocates at most at one time
+# Reports the median, mean and largest of those peaks, returns False when the median tick peaks more
+# than max_bytes above its start, now and then a tick allocates more, when bodies fall asleep or
+# wake up, or a body moves into cells of the spatial hash that were empty
+# A scene switch is traced too, setting a scene up again reuses the objects of the last setup
+def steady_allocations(ticks, warmup=120, max_bytes=1024):
+    game_state = gamestate.GameState(headless=True)
+    scene = Stress_Walls(game_state, 1000)
+    inputs = scripted_inputs(warmup + ticks)
+    tracemalloc.start()
+    headless.run(scene, inputs[:warmup], warmup)
+
+    world = game_state.world
+    peaks = []
+    for tick in range(warmup, warmup + ticks):
+        start, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        game_state.input = inputs[tick]
+        game_state.character_controller.set_input(game_state.input)
+        world.step()
+        scenes.update_view(game_state)
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - start)
+    tracemalloc.stop()
+
+    peaks.sort()
+    median = peaks[len(peaks) // 2]
+    print()
+    print(f"{'peak bytes':<14}{'median':>12}{'mean':>12}{'max':>15}")
+    print(f"{'per tick':<14}{median:>12}{sum(peaks) / len(peaks):>12.1f}{peaks[-1]:>15}")
+
+    reused = set(map(id, world.bodies))
+    scene.setup()
+    reused &= set(map(id, world.bodies))
+    print(f"scene switch reused {len(reused)} of {len(world.bodies)} bodies")
+
+    if median > max_bytes:
+        print(f"the median tick allocated more than {max_bytes} bytes")
+        return False
+    return True
+
+
+if __name__ == "__main__":
+    main()
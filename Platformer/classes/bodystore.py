@@ -0,0 +1,119 @@
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, without it bodies keep their own state
+    np = None
+
+
+# BodyStore class that keeps the state of many Physical bodies in contiguous numpy arrays
+# (structure of arrays), one row per body
+# The velocity of a body added to the store lives in its row, so gravity, integration and damping
+# can run for all bodies at once in integrate(), its position, imass, restitution and the locked
+# and sleeping flags are kept on the body as well and written through to the row
+# Whatever moves rows here hands the new positions back to their bodies
+class BodyStore:
+    def __init__(self, capacity=64):
+        if np is None:
+            raise ImportError("BodyStore needs numpy, install it or run without a body store")
+        self.count = 0
+        self.bodies = []
+        self.position = np.zeros((capacity, 2))
+        self.size = np.zeros((capacity, 2))
+        self.velocity = np.zeros((capacity, 2))
+        self.imass = np.zeros(capacity)
+        self.restitution = np.zeros(capacity)
+        self.locked = np.zeros(capacity, dtype=bool)
+        self.sleeping = np.zeros(capacity, dtype=bool)
+
+    @property
+    def capacity(self):
+        return len(self.imass)
+
+    # double the size of every array, keeping the rows that are in use
+    def grow(self):
+        capacity = self.capacity * 2
+        for name in ("position", "size", "velocity", "imass", "restitution", "locked", "sleeping"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    # add a body to the store, copying its current state into a new row
+    def add(self, body):
+        if self.count == self.capacity:
+            self.grow()
+        index = self.count
+        self.position[index] = body.x, body.y
+        self.size[index] = body.width, body.height
+        self.velocity[index] = body.velocity.x, body.velocity.y
+        self.imass[index] = body.imass
+        self.restitution[index] = body.restitution
+        self.locked[index] = body.locked
+        self.sleeping[index] = body.sleeping
+        self.bodies.append(body)
+        self.count += 1
+        body._store = self
+        body._index = index
+
+    # remove a body from the store, the last row is moved into its place
+    def remove(self, body):
+        index = body._index
+        body._velocity.update(self.velocity[index].tolist())
+        last = self.count - 1
+        if index != last:
+            for array in (self.position, self.size, self.velocity, self.imass, self.restitution, self.locked,
+                          self.sleeping):
+                array[index] = array[last]
+            moved = self.bodies[last]
+            self.bodies[index] = moved
+            moved._index = index
+        self.bodies.pop()
+        self.count -= 1
+        body._store = None
+        body._index = None
+
+    # drop every body from the store
+    def clear(self):
+        for body in self.bodies:
+            body._velocity.update(self.velocity[body._index].tolist())
+            body._store = None
+            body._index = None
+        self.bodies.clear()
+        self.count = 0
+
+    # apply gravity, move every body by its velocity and damp the x velocity, for all rows at once
+    # scale is the length of the step in ticks, same as Physical.step, locked and sleeping rows stay put
+    # rows set in skip are left alone too, so the caller can move them another way
+    def integrate(self, gravity, scale=1.0, skip=None):
+        n = self.count
+        moving = ~(self.locked[:n] | self.sleeping[:n])
+        if skip is not None:
+            moving &= ~skip
+        rows = np.flatnonzero(moving)
+        velocity = self.velocity[rows]
+        velocity[:, 1] += gravity * scale
+        self.position[rows] += velocity * scale
+        velocity[:, 0] *= 0.8 ** scale
+        self.velocity[rows] = velocity
+        self.moved(rows.tolist())
+
+    # move the bodies in rows by offsets, a list of (dx, dy)
+    def move_rows(self, rows, offsets):
+        self.position[rows] += offsets
+        self.moved(rows)
+
+    # hand the positions of rows that were moved here back to their bodies
+    def moved(self, rows):
+        bodies = self.bodies
+        for index, (x, y) in zip(rows, self.position[rows].tolist()):
+            body = bodies[index]
+            body._x = x
+            body._y = y
+            body._stale = True
+
+    # rows whose move this step, gravity included, is more than threshold of their size on either axis
+    def fast(self, gravity, scale=1.0, threshold=0.5):
+        n = self.count
+        moving = ~(self.locked[:n] | self.sleeping[:n])
+        move = self.velocity[:n] * scale
+        move[:, 1] += gravity * scale * scale
+        return moving & (np.abs(move) > self.size[:n] * threshold).any(axis=1)
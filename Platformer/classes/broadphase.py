@@ -0,0 +1,430 @@
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from itertools import combinations
+from . import layers
+
+# objects closer than this (px) are paired as well, positions are floats and rects are rounded, so
+# two bodies that overlap by a fraction of a pixel can have rects that only touch, without the
+# margin a resting contact would come and go from one tick to the next
+MARGIN = 1
+
+
+# whether two rects overlap or are less than MARGIN apart
+def near(a, b):
+    return a.left < b.right + MARGIN and b.left < a.right + MARGIN and \
+        a.top < b.bottom + MARGIN and b.top < a.bottom + MARGIN
+
+
+# Broadphase base class, a broadphase takes the list of objects in the game and
+# returns the (A, B) pairs whose rectangles overlap, so the narrowphase only runs on those
+# Pairs are returned in the same order itertools.combinations would produce them,
+# with A being the object that comes first in the list
+# Objects within MARGIN of each other count as overlapping, the narrowphase has the final say
+class Broadphase(ABC):
+    @abstractmethod
+    def find_pairs(self, list_of_objects):
+        pass
+
+    # forget everything that was cached, called when a scene clears its entities
+    def clear(self):
+        pass
+
+
+# BruteForce broadphase tests every pair of objects against each other
+# This is O(n^2) and is kept around as the reference implementation
+class BruteForce(Broadphase):
+    def find_pairs(self, list_of_objects):
+        pairs = []
+        for obj1, obj2 in combinations(list_of_objects, 2):
+            if obj1.resting and obj2.resting:  # If both objects are static or asleep, skip
+                continue
+            if not layers.can_collide(obj1, obj2):  # If their layers don't collide, skip
+                continue
+            if near(obj1.rect, obj2.rect):
+                pairs.append((obj1, obj2))
+        return pairs
+
+
+# Entry in the static part of the spatial hash, remembers the rect a static object
+# was inserted with, so it only gets re-inserted when that rect changes
+class _StaticEntry:
+    def __init__(self, rect, cells, index):
+        self.rect = rect
+        self.cells = cells
+        self.index = index
+
+
+# SpatialHash broadphase that buckets objects into a uniform grid of square cells
+# Resting (locked or sleeping) objects are inserted once and stay in their buckets, moving
+# objects are re-bucketed every time find_pairs is called
+# Each moving object is only tested against the objects that share a cell with it,
+# so the cost grows with the local density of objects instead of the total count
+# Pairs whose collision layers don't match are rejected before their rects are tested
+class SpatialHash(Broadphase):
+    def __init__(self, cell_size=20):
+        self.cell_size = cell_size
+        self.static_cells = {}
+        self.static_entries = {}
+        # scratch state of find_pairs, kept from one call to the next so a call allocates next to
+        # nothing: the moving objects and their indices, their buckets and the keys of the buckets
+        # in use, the objects a moving object was already tested against, and the pairs found
+        self.moving = []
+        self.moving_indices = []
+        self.moving_cells = {}
+        self.used_keys = []
+        self.last_keys = []
+        self.seen = set()
+        self.keys = []
+
+    # list the keys of all cells that a rect overlaps
+    def cells_for(self, rect):
+        size = self.cell_size
+        x0 = rect.left // size
+        x1 = max((rect.right - 1) // size, x0)
+        y0 = rect.top // size
+        y1 = max((rect.bottom - 1) // size, y0)
+        return [(cx, cy) for cx in range(x0, x1 + 1) for cy in range(y0, y1 + 1)]
+
+    def clear(self):
+        self.static_cells.clear()
+        self.static_entries.clear()
+        self.moving.clear()
+        self.moving_cells.clear()
+        self.used_keys.clear()
+
+    def insert_static(self, obj, index):
+        cells = self.cells_for(obj.rect)
+        for key in cells:
+            bucket = self.static_cells.get(key)
+            if bucket is None:
+                self.static_cells[key] = [obj]
+            else:
+                bucket.append(obj)
+        self.static_entries[obj] = _StaticEntry(obj.rect.copy(), cells, index)
+
+    def remove_static(self, obj):
+        entry = self.static_entries.pop(obj)
+        for key in entry.cells:
+            bucket = self.static_cells[key]
+            bucket.remove(obj)
+            if not bucket:
+                del self.static_cells[key]
+
+    # bring the static buckets in line with the resting objects in the list, and fill moving with the
+    # moving ones and moving_indices with where they are in the list
+    # Objects whose rect did not change since they were inserted are left alone
+    def sync_static(self, list_of_objects):
+        moving = self.moving
+        moving_indices = self.moving_indices
+        moving.clear()
+        moving_indices.clear()
+        static_count = 0
+        for index, obj in enumerate(list_of_objects):
+            if not obj.resting:
+                moving.append(obj)
+                moving_indices.append(index)
+                continue
+            static_count += 1
+            entry = self.static_entries.get(obj)
+            if entry is None:
+                self.insert_static(obj, index)
+            elif entry.rect != obj.rect:
+                self.remove_static(obj)
+                self.insert_static(obj, index)
+            else:
+                entry.index = index
+
+        # Some static objects were destroyed or unlocked, drop them from the buckets
+        if static_count != len(self.static_entries):
+            current = set(obj for obj in list_of_objects if obj.resting)
+            for obj in [obj for obj in self.static_entries if obj not in current]:
+                self.remove_static(obj)
+
+    def find_pairs(self, list_of_objects):
+        self.sync_static(list_of_objects)
+        moving = self.moving
+        size = self.cell_size
+
+        # Empty the buckets of the last call, the ones that are still empty once the moving objects
+        # are bucketed again are dropped, so only the cells around moving objects are kept
+        moving_cells = self.moving_cells
+        last_keys = self.used_keys
+        used_keys = self.last_keys
+        self.used_keys = used_keys
+        self.last_keys = last_keys
+        used_keys.clear()
+        for key in last_keys:
+            moving_cells[key].clear()
+
+        # Re-bucket every moving object, grown by the margin, the buckets hold positions in moving
+        for position, obj in enumerate(moving):
+            rect = obj.rect
+            x0 = (rect.left - MARGIN) // size
+            x1 = max((rect.right + MARGIN - 1) // size, x0)
+            y0 = (rect.top - MARGIN) // size
+            y1 = max((rect.bottom + MARGIN - 1) // size, y0)
+            for cx in range(x0, x1 + 1):
+                for cy in range(y0, y1 + 1):
+                    key = (cx, cy)
+                    bucket = moving_cells.get(key)
+                    if bucket is None:
+                        bucket = moving_cells[key] = []
+                    if not bucket:
+                        used_keys.append(key)
+                    bucket.append(position)
+        for key in last_keys:
+            if not moving_cells[key]:
+                del moving_cells[key]
+
+        # Pairs are kept as i * n + j, i and j their indices in the list, so sorting the keys
+        # puts them in the same order as combinations() over the list
+        n = len(list_of_objects)
+        keys = self.keys
+        keys.clear()
+        seen = self.seen
+        moving_indices = self.moving_indices
+        for position, obj in enumerate(moving):
+            index = moving_indices[position]
+            rect = obj.rect
+            seen.clear()
+            x0 = (rect.left - MARGIN) // size
+            x1 = max((rect.right + MARGIN - 1) // size, x0)
+            y0 = (rect.top - MARGIN) // size
+            y1 = max((rect.bottom + MARGIN - 1) // size, y0)
+            for cx in range(x0, x1 + 1):
+                for cy in range(y0, y1 + 1):
+                    # Moving vs static
+                    for other in self.static_cells.get((cx, cy), ()):
+                        if other in seen:
+                            continue
+                        seen.add(other)
+                        if not layers.can_collide(obj, other):
+                            continue
+                        if near(rect, other.rect):
+                            other_index = self.static_entries[other].index
+                            if other_index < index:
+                                keys.append(other_index * n + index)
+                            else:
+                                keys.append(index * n + other_index)
+                    # Moving vs moving, only look forward in the list so each pair is found once
+                    for other_position in moving_cells[(cx, cy)]:
+                        other = moving[other_position]
+                        if other_position <= position or other in seen:
+                            continue
+                        seen.add(other)
+                        if not layers.can_collide(obj, other):
+                            continue
+                        if near(rect, other.rect):
+                            keys.append(index * n + moving_indices[other_position])
+
+        keys.sort()
+        return [(list_of_objects[key // n], list_of_objects[key % n]) for key in keys]
+
+
+# Endpoint of an object's interval on one axis of the sweep and prune
+# key is twice the coordinate, plus one for the start of the interval, so at the same coordinate
+# an interval ends before the next one starts, intervals end MARGIN after their rect does, so two
+# intervals overlap on both axes exactly when near() is true for the rects
+class _Endpoint:
+
+    __slots__ = ("obj", "is_max", "key")
+
+    def __init__(self, obj, is_max):
+        self.obj = obj
+        self.is_max = is_max
+        self.key = 0
+
+
+# SweepAndPrune broadphase that keeps the x and y intervals of every object in two sorted lists
+# of endpoints, and the set of overlapping pairs, from one call to the next
+# Objects only move a little each tick, so the lists are nearly sorted and an insertion sort puts
+# them back in order in close to O(n), every swap of a start with an end is where two intervals
+# start or stop overlapping:
+#  - a start passing an end to the left, the objects may overlap now, their rects are tested
+#  - an end passing a start to the left, the objects no longer overlap
+# Only the endpoints of objects whose rect changed since the last call are updated
+# The pairs are also kept in the order find_pairs returns them in, the pairs that began and ended
+# overlapping are put in and taken out of it, it is only sorted again when the list of objects changes
+# Unlike a grid it does not care how big objects are, so a full-width wall next to tiny steps
+# costs the same as two steps
+# After every call began and ended hold the pairs that started and stopped overlapping
+class SweepAndPrune(Broadphase):
+    def __init__(self):
+        self.axes = ([], [])
+        # the four endpoints of every object, the rect they were set from, and a number to order
+        # the objects of a pair by
+        self.endpoints = {}
+        self.rects = {}
+        self.serials = {}
+        self.next_serial = 0
+        # overlapping pairs by key, and the keys of the pairs of every object
+        self.pairs = {}
+        self.partners = {}
+        self.began = []
+        self.ended = []
+        self.changes = {}
+        # the objects of the last call and their place in the list, and the overlapping pairs in
+        # list order with their sort keys next to them
+        self.objects = []
+        self.index = {}
+        self.order = []
+        self.ordered = []
+
+    def clear(self):
+        for axis in self.axes:
+            axis.clear()
+        self.endpoints.clear()
+        self.rects.clear()
+        self.serials.clear()
+        self.pairs.clear()
+        self.partners.clear()
+        self.began = []
+        self.ended = []
+        self.changes = {}
+        self.objects = []
+        self.index = {}
+        self.order = []
+        self.ordered = []
+
+    # key of the pair of two objects, the same whichever comes first
+    def key(self, a, b):
+        if self.serials[a] < self.serials[b]:
+            return a, b
+        return b, a
+
+    def add_pair(self, a, b):
+        key = self.key(a, b)
+        if key in self.pairs:
+            return
+        if key not in self.changes:
+            self.changes[key] = False
+        self.pairs[key] = key
+        self.partners[a].add(key)
+        self.partners[b].add(key)
+
+    def remove_pair(self, a, b):
+        key = self.key(a, b)
+        if key not in self.pairs:
+            return
+        if key not in self.changes:
+            self.changes[key] = True
+        del self.pairs[key]
+        self.partners[a].discard(key)
+        self.partners[b].discard(key)
+
+    # the intervals of two objects started overlapping on one axis, keep them if they overlap on both
+    def touch(self, a, b):
+        if not layers.can_collide(a, b):
+            return
+        if near(a.rect, b.rect):
+            self.add_pair(a, b)
+
+    # set the keys of an object's endpoints from its rect
+    def place(self, obj, rect):
+        min_x, max_x, min_y, max_y = self.endpoints[obj]
+        min_x.key = rect.left * 2 + 1
+        max_x.key = (rect.right + MARGIN) * 2
+        min_y.key = rect.top * 2 + 1
+        max_y.key = (rect.bottom + MARGIN) * 2
+
+    def insert(self, obj):
+        self.serials[obj] = self.next_serial
+        self.next_serial += 1
+        self.partners[obj] = set()
+        points = (_Endpoint(obj, False), _Endpoint(obj, True), _Endpoint(obj, False), _Endpoint(obj, True))
+        self.endpoints[obj] = points
+        self.rects[obj] = obj.rect.copy()
+        self.place(obj, obj.rect)
+        # added at the end, the next sort moves them into place and finds their pairs on the way
+        self.axes[0].extend(points[:2])
+        self.axes[1].extend(points[2:])
+
+    def remove(self, objs):
+        for obj in objs:
+            for key in list(self.partners[obj]):
+                self.remove_pair(*key)
+            del self.endpoints[obj]
+            del self.rects[obj]
+            del self.serials[obj]
+            del self.partners[obj]
+        for axis in self.axes:
+            axis[:] = [point for point in axis if point.obj in self.endpoints]
+
+    # insertion sort of the endpoints of one axis, turning swaps into overlap changes
+    def sort_axis(self, points):
+        for i in range(1, len(points)):
+            point = points[i]
+            key = point.key
+            if points[i - 1].key <= key:
+                continue
+            j = i - 1
+            while j >= 0 and points[j].key > key:
+                other = points[j]
+                if point.is_max != other.is_max:
+                    if point.is_max:
+                        self.remove_pair(point.obj, other.obj)
+                    else:
+                        self.touch(point.obj, other.obj)
+                points[j + 1] = other
+                j -= 1
+            points[j + 1] = point
+
+    # bring the endpoint lists and the pairs in line with the objects and where they are now
+    # changed is True when the list of objects is not the one of the last call
+    def update(self, list_of_objects, index, changed=True):
+        self.changes = {}
+        if changed and (len(self.endpoints) != len(index) or any(obj not in self.endpoints for obj in index)):
+            self.remove([obj for obj in self.endpoints if obj not in index])
+            for obj in list_of_objects:
+                if obj not in self.endpoints:
+                    self.insert(obj)
+
+        rects = self.rects
+        for obj in list_of_objects:
+            rect = obj.rect
+            last = rects[obj]
+            if last != rect:
+                last.update(rect)
+                self.place(obj, rect)
+        self.sort_axis(self.axes[0])
+        self.sort_axis(self.axes[1])
+
+        self.began = [key for key, was in self.changes.items() if not was and key in self.pairs]
+        self.ended = [key for key, was in self.changes.items() if was and key not in self.pairs]
+
+    # sort key and list order of the two objects of a pair, the same order combinations() has
+    def position(self, a, b):
+        i = self.index[a]
+        j = self.index[b]
+        if i < j:
+            return i * len(self.objects) + j, (a, b)
+        return j * len(self.objects) + i, (b, a)
+
+    def find_pairs(self, list_of_objects):
+        objects = list(list_of_objects)
+        changed = objects != self.objects
+        if changed:
+            self.objects = objects
+            self.index = {obj: i for i, obj in enumerate(objects)}
+        self.update(objects, self.index, changed)
+
+        order = self.order
+        ordered = self.ordered
+        if changed:
+            # the places in the list changed, sort all pairs again
+            found = sorted(self.position(a, b) for a, b in self.pairs.values())
+            order[:] = [place for place, _ in found]
+            ordered[:] = [pair for _, pair in found]
+        else:
+            for a, b in self.ended:
+                i = bisect_left(order, self.position(a, b)[0])
+                del order[i]
+                del ordered[i]
+            for a, b in self.began:
+                place, pair = self.position(a, b)
+                i = bisect_left(order, place)
+                order.insert(i, place)
+                ordered.insert(i, pair)
+
+        # If both objects are static or asleep, skip
+        return [pair for pair in ordered if not (pair[0].resting and pair[1].resting)]
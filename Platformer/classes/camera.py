@@ -0,0 +1,35 @@
+import pygame
+
+
+# Camera class, the part of the world that is shown on the screen
+# rect is the viewport in world coordinates, objects are drawn at their rect moved by -offset
+# With a target the camera keeps it in the middle of the screen, staying inside bounds if given
+class Camera:
+    def __init__(self, width, height, x=0, y=0):
+        self.rect = pygame.Rect(x, y, width, height)
+        self.target = None
+        self.bounds = None
+
+    @property
+    def offset(self):
+        return self.rect.x, self.rect.y
+
+    # follow the target, called once per frame after the physics ran
+    # center is where the target is drawn, when that is not where it is (interpolated drawing)
+    def update(self, center=None):
+        if center is None and self.target is not None:
+            center = self.target.center
+        if center is not None:
+            self.rect.center = round(center.x), round(center.y)
+        if self.bounds is not None:
+            self.rect.clamp_ip(self.bounds)
+
+    # go back to the top left corner without a target, for scenes that fit on the screen
+    def reset(self):
+        self.rect.topleft = (0, 0)
+        self.target = None
+        self.bounds = None
+
+    # whether a rect in world coordinates is on the screen
+    def sees(self, rect):
+        return self.rect.colliderect(rect)
@@ -0,0 +1,97 @@
+import pygame.math as pgm
+from . import shapes
+
+# Continuous collision detection for bodies that move further in one step than their own size
+# Instead of jumping to the end of their move, which lets them skip over thin walls, these bodies
+# are swept: the time of impact with everything in the way is found, the body is moved up to the
+# first hit, the part of its velocity going into the surface is taken out, and the rest of the
+# move continues from there (a sub-step per hit)
+# Times of impact are fractions of the move, from 0 (the start) to 1 (the end)
+
+INFINITY = float("inf")
+
+
+# range of times in which a moving interval [start_min, start_max] overlaps a still one,
+# or None when they never overlap on this axis
+def slab(start_min, start_max, d, other_min, other_max):
+    if d == 0:
+        if start_max <= other_min or start_min >= other_max:
+            return None
+        return -INFINITY, INFINITY
+    t0 = (other_min - start_max) / d
+    t1 = (other_max - start_min) / d
+    if t0 > t1:
+        t0, t1 = t1, t0
+    return t0, t1
+
+
+# time of impact of a box moving by (dx, dy) against a still box
+# returns (t, normal) with the normal pointing out of the still box, or None when they don't hit
+# Boxes that already overlap at the start are left to the regular collision response
+def aabb_toi(left, top, right, bottom, dx, dy, other):
+    x = slab(left, right, dx, other.left, other.right)
+    if x is None:
+        return None
+    y = slab(top, bottom, dy, other.top, other.bottom)
+    if y is None:
+        return None
+
+    entry = max(x[0], y[0])
+    leave = min(x[1], y[1])
+    if entry >= leave or entry < 0 or entry > 1:
+        return None
+
+    if x[0] > y[0]:
+        normal = pgm.Vector2(-1 if dx > 0 else 1, 0)
+    else:
+        normal = pgm.Vector2(0, -1 if dy > 0 else 1)
+    return entry, normal
+
+
+# time of impact of a circle moving by (dx, dy) against a still box
+# The center is swept against the box grown by the radius, when it enters near a corner it is
+# swept against the circle around that corner instead
+def circle_toi(cx, cy, r, dx, dy, other):
+    hit = aabb_toi(cx - r, cy - r, cx + r, cy + r, dx, dy, other)
+    if hit is None:
+        return None
+    t, normal = hit
+
+    px = cx + dx * t
+    py = cy + dy * t
+    corner_x = other.left if px < other.left else other.right if px > other.right else None
+    corner_y = other.top if py < other.top else other.bottom if py > other.bottom else None
+    if corner_x is None or corner_y is None:
+        return hit
+
+    # solve |c + d t - corner| = r for the first t
+    fx = cx - corner_x
+    fy = cy - corner_y
+    a = dx * dx + dy * dy
+    b = 2 * (fx * dx + fy * dy)
+    c = fx * fx + fy * fy - r * r
+    discriminant = b * b - 4 * a * c
+    if a == 0 or discriminant < 0:
+        return None
+    t = (-b - discriminant ** 0.5) / (2 * a)
+    if t < 0 or t > 1:
+        return None
+    normal = pgm.Vector2(fx + dx * t, fy + dy * t)
+    if normal.length_squared() == 0:
+        return None
+    return t, normal.normalize()
+
+
+# time of impact of a body at (x, y) moving by (dx, dy) against a still rect, for the body's shape
+def time_of_impact(body, x, y, dx, dy, other):
+    width = body.width
+    height = body.height
+    if body.shape == shapes.CIRCLE:
+        r = width / 2
+        return circle_toi(x + r, y + height / 2, r, dx, dy, other)
+    return aabb_toi(x, y, x + width, y + height, dx, dy, other)
+
+
+# whether a body moves far enough in a step to need sweeping, threshold is a fraction of its size
+def is_fast(body, dx, dy, threshold=0.5):
+    return abs(dx) > body.width * threshold or abs(dy) > body.height * threshold
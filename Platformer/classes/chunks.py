@@ -0,0 +1,185 @@
+import json
+import os
+import random
+from collections import OrderedDict
+from . import entities
+
+
+# Chunk class, one square of a chunked level
+# walls are the walls loaded from the chunk's file, baked into the world's static geometry, the
+# chunk is their owner so they never merge with walls of other chunks or walls placed by the player,
+# placed walls belong to no chunk and stay when chunks are evicted
+# parked are the moving bodies of the chunk while it is not active, they are out of the world
+class Chunk:
+    def __init__(self, key):
+        self.key = key
+        self.walls = []
+        self.parked = []
+        self.active = False
+
+
+# ChunkMap class that streams a level split into fixed-size square chunks from disk
+# Every chunk is a json file in path named "<cx>_<cy>.json", with
+#   "walls": [[x, y, width, height, [r, g, b]], ...] and "goals": [[x, y], ...]
+# update() is called every frame with the point the camera looks at
+#  - chunks within load_radius of it are loaded, so they are ready before they are seen
+#  - chunks within active_radius are active, only their bodies are in the world and simulated,
+#    the bodies of every other chunk are parked (taken out of the world) until it is active again
+#  - when more than max_loaded chunks are loaded, the least recently used ones that are not
+#    needed are evicted, their walls are dropped and reloaded from disk when they are needed again
+# The moving bodies of a chunk are only made from its file the first time it is loaded, after
+# that they are kept parked, so bodies that were destroyed (goals picked up) stay gone
+# Bodies in keep (the player) are never parked
+class ChunkMap:
+    def __init__(self, world, path, chunk_size=640, active_radius=1, load_radius=2, max_loaded=64):
+        self.world = world
+        self.path = path
+        self.chunk_size = chunk_size
+        self.active_radius = active_radius
+        self.load_radius = load_radius
+        self.max_loaded = max_loaded
+        self.chunks = OrderedDict()
+        # parked bodies of chunks that are not loaded, and the chunks whose bodies were made
+        self.evicted = {}
+        self.populated = set()
+        self.keep = set()
+
+    # key of the chunk a point is in
+    def key_for(self, x, y):
+        return int(x // self.chunk_size), int(y // self.chunk_size)
+
+    def file_for(self, key):
+        return os.path.join(self.path, f"{key[0]}_{key[1]}.json")
+
+    # keys of the chunks within radius chunks of a key
+    def around(self, key, radius):
+        return [(key[0] + i, key[1] + j)
+                for j in range(-radius, radius + 1) for i in range(-radius, radius + 1)]
+
+    # read a chunk from disk and bake its walls into the world
+    def load(self, key):
+        chunk = Chunk(key)
+        path = self.file_for(key)
+        if os.path.exists(path):
+            with open(path) as file:
+                data = json.load(file)
+            for x, y, width, height, color in data.get("walls", ()):
+                wall = entities.Wall(x, y, width, height, tuple(color), world=self.world)
+                wall.owner = chunk
+                self.world.bake_wall(wall)
+                chunk.walls.append(wall)
+            if key not in self.populated:
+                for x, y in data.get("goals", ()):
+                    chunk.parked.append(entities.Goal(x, y))
+        self.populated.add(key)
+        chunk.parked += self.evicted.pop(key, [])
+        self.chunks[key] = chunk
+        return chunk
+
+    # drop a chunk's walls, its parked bodies are kept for when it is loaded again
+    # The walls of a chunk only merge with each other, the ones that were merged into another are
+    # already gone
+    def evict(self, key):
+        chunk = self.chunks.pop(key)
+        for wall in chunk.walls:
+            if wall.alive:
+                wall.destroy()
+        if chunk.parked:
+            self.evicted[key] = chunk.parked
+
+    # put the parked bodies of a chunk back into the world
+    def activate(self, chunk):
+        for body in chunk.parked:
+            self.world.add(body)
+            if body.sleeping:
+                self.world.sleeping.add(body)
+        chunk.parked = []
+        chunk.active = True
+
+    # take a body out of the world and park it with the chunk it is in
+    def park(self, body):
+        self.world.remove(body)
+        center = body.center
+        key = self.key_for(center.x, center.y)
+        chunk = self.chunks.get(key)
+        if chunk is not None:
+            chunk.parked.append(body)
+        else:
+            self.evicted.setdefault(key, []).append(body)
+
+    def update(self, x, y):
+        center = self.key_for(x, y)
+        active = set(self.around(center, self.active_radius))
+        wanted = self.around(center, self.load_radius)
+
+        for key in wanted:
+            if key not in self.chunks:
+                self.load(key)
+            self.chunks.move_to_end(key)
+
+        for key, chunk in self.chunks.items():
+            if key in active:
+                if not chunk.active:
+                    self.activate(chunk)
+            else:
+                chunk.active = False
+
+        # bodies that are outside the active chunks, because they moved or their chunk is no longer active
+        for body in list(self.world.bodies):
+            if body in self.keep:
+                continue
+            body_center = body.center
+            if self.key_for(body_center.x, body_center.y) not in active:
+                self.park(body)
+
+        # evict the least recently used chunks
+        wanted = set(wanted)
+        for key in list(self.chunks):
+            if len(self.chunks) <= self.max_loaded:
+                break
+            if key not in wanted:
+                self.evict(key)
+
+    # number of parked bodies, in loaded and evicted chunks
+    @property
+    def parked_count(self):
+        return sum(len(chunk.parked) for chunk in self.chunks.values()) \
+            + sum(len(bodies) for bodies in self.evicted.values())
+
+
+# write a long generated level as chunk files, chunks_wide chunks side by side in one row
+# Every chunk gets a floor with a gap now and then, and a few platforms, some with a goal on top
+def write_level(path, chunks_wide, chunk_size=640, height=600, seed=0):
+    rng = random.Random(seed)
+    os.makedirs(path, exist_ok=True)
+    grid = 20
+    for cx in range(chunks_wide):
+        x0 = cx * chunk_size
+        walls = []
+        goals = []
+
+        # floor, with a gap in the middle of every other chunk but the first
+        if cx % 2 == 1:
+            gap = rng.randrange(4, chunk_size // grid - 8) * grid
+            walls.append([x0, height - grid, gap, grid, [50, 50, 200]])
+            walls.append([x0 + gap + 2 * grid, height - grid, chunk_size - gap - 2 * grid, grid, [50, 50, 200]])
+        else:
+            walls.append([x0, height - grid, chunk_size, grid, [50, 50, 200]])
+
+        # the ends of the level
+        if cx == 0:
+            walls.append([x0, 0, grid, height - grid, [50, 50, 200]])
+        if cx == chunks_wide - 1:
+            walls.append([x0 + chunk_size - grid, 0, grid, height - grid, [50, 50, 200]])
+
+        # platforms
+        for _ in range(rng.randrange(1, 4)):
+            width = rng.randrange(3, 10) * grid
+            x = x0 + rng.randrange(1, (chunk_size - width) // grid) * grid
+            y = rng.randrange(10, height // grid - 4) * grid
+            walls.append([x, y, width, grid, [200, 200, 200]])
+            if rng.random() < 0.3:
+                goals.append([x + width // 2 - 20, y - 80])
+
+        with open(os.path.join(path, f"{cx}_0.json"), "w") as file:
+            json.dump({"walls": walls, "goals": goals}, file)
@@ -1,12 +1,17 @@
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, without it CrowdController runs one player at a time
+    np = None
+
 from . import entities
 
 # input class that represents the input state of the game for a character controller
 class Input:
-    def __init__(self):
-        self.left = False
-        self.right = False
-        self.jump = False
-        self.down = False
+    def __init__(self, left=False, right=False, jump=False, down=False):
+        self.left = left
+        self.right = right
+        self.jump = jump
+        self.down = down
 
 # character controller class that handles player input and movement
 class CharacterController:
@@ -14,14 +19,16 @@ class CharacterController:
         self.player = player
         self.move_delta_velocity = 1.0
         self.jump_velocity = 4.0
+        # moving only speeds a player up while it is slower than this
+        self.max_speed = 2
 
     # handle input for the player
     def handle_input(self, input: Input):
 
         # Left and Right Movement
-        if input.left and self.player.velocity.x > -2:
+        if input.left and self.player.velocity.x > -self.max_speed:
             self.player.add_velocity(vx= -self.move_delta_velocity, vy=0)
-        if input.right and self.player.velocity.x < 2:
+        if input.right and self.player.velocity.x < self.max_speed:
             self.player.add_velocity(vx= self.move_delta_velocity, vy=0)
 
         # Jump
@@ -32,4 +39,80 @@ class CharacterController:
 
     # run the character controller
     def set_input(self, input: Input):
-        self.handle_input(input)
\ No newline at end of file
+        self.handle_input(input)
+
+
+# CrowdController class that drives many players at once, each with its own input
+# It follows the same rules as CharacterController (speed up while slower than max_speed, jump only
+# while standing) for every player in one numpy pass over their velocities, read from and written
+# back to the world's BodyStore rows when the players are in one
+# Only the players whose velocity changed are written back, woken up, or (when they jumped) lose
+# standing, so idle players cost next to nothing
+class CrowdController:
+    def __init__(self, players, move_delta_velocity=1.0, jump_velocity=4.0, max_speed=2):
+        self.players = list(players)
+        self.move_delta_velocity = move_delta_velocity
+        self.jump_velocity = jump_velocity
+        self.max_speed = max_speed
+
+    # apply one Input per player
+    def set_inputs(self, inputs):
+        inputs = list(inputs)
+        self.apply([input.left for input in inputs], [input.right for input in inputs],
+                   [input.jump for input in inputs])
+
+    # apply the buttons of every player, given as one sequence (or bool array) per button
+    def apply(self, left, right, jump):
+        if np is None:
+            self.apply_each(left, right, jump)
+            return
+        players = self.players
+        count = len(players)
+        left = np.asarray(left, dtype=bool)
+        right = np.asarray(right, dtype=bool)
+        jump = np.asarray(jump, dtype=bool)
+        standing = np.fromiter((player.standing for player in players), bool, count)
+
+        store = players[0]._store if count else None
+        if store is not None and all(player._store is store for player in players):
+            rows = np.fromiter((player._index for player in players), np.intp, count)
+            velocity = store.velocity[rows]
+        else:
+            store = None
+            velocity = np.array([(player.velocity.x, player.velocity.y) for player in players]).reshape(count, 2)
+        vx = velocity[:, 0]
+        vy = velocity[:, 1]
+
+        # Left and Right Movement, right is checked against the speed after moving left, like the
+        # single player controller does
+        moved_left = left & (vx > -self.max_speed)
+        vx = np.where(moved_left, vx - self.move_delta_velocity, vx)
+        moved_right = right & (vx < self.max_speed)
+        vx = np.where(moved_right, vx + self.move_delta_velocity, vx)
+
+        # Jump
+        jumped = jump & standing
+        vy = np.where(jumped, -self.jump_velocity, vy)
+
+        changed = np.flatnonzero(moved_left | moved_right | jumped)
+        if store is not None:
+            store.velocity[rows[changed], 0] = vx[changed]
+            store.velocity[rows[changed], 1] = vy[changed]
+        for i in changed:
+            player = players[i]
+            if store is None:
+                player.velocity.x = vx[i]
+                player.velocity.y = vy[i]
+            if player.sleeping:
+                player.wake()
+        for i in np.flatnonzero(jumped):
+            players[i].standing = False
+
+    # apply the buttons one player at a time, without numpy
+    def apply_each(self, left, right, jump):
+        for player, l, r, j in zip(self.players, left, right, jump):
+            controller = CharacterController(player)
+            controller.move_delta_velocity = self.move_delta_velocity
+            controller.jump_velocity = self.jump_velocity
+            controller.max_speed = self.max_speed
+            controller.handle_input(Input(bool(l), bool(r), bool(j)))
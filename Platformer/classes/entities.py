@@ -1,67 +1,122 @@
 import pygame
 import pygame.math as pgm
-from itertools import combinations
 import math
+from . import shapes, layers
 
 # Drawable class that represents an instance of an object in the game
 # It has an initial size, keeps track of it's rectangle object, and has a draw method
+# The position and size are kept as floats, so small moves add up instead of being rounded away
+# The pygame.Rect is only built from them when it is asked for (for drawing and the broadphase)
+# and is cached, together with the center, when the object moves they are updated in place the
+# next time they are asked for, so moving does not allocate
+# Entities have __slots__ instead of a __dict__, subclasses have to list the attributes they add
 class Drawable:
 
+    __slots__ = ("_x", "_y", "_width", "_height", "_rect", "_center", "_stale", "color")
+
+    # shape the object is drawn as, used to look up its pre-rendered sprite
+    draw_shape = "rect"
+
     # getters for the x and y position of the object
     @property
     def x(self):
-        return self.rect.x
+        return self._x
     
     @x.setter
     def x(self, value):
-        self.rect.x = value
+        self.move_to(value, self.y)
     
     @property
     def y(self):
-        return self.rect.y
+        return self._y
     
     @y.setter
     def y(self, value):
-        self.rect.y = value
+        self.move_to(self.x, value)
 
     # getters for the left, right, top, and bottom of the object
     @property
     def left(self):
-        return self.rect.left
+        return self._x
     
     @property
     def right(self):
-        return self.rect.right
+        return self._x + self._width
     
     @property
     def top(self):
-        return self.rect.top
+        return self._y
     
     @property
     def bottom(self):
-        return self.rect.bottom
+        return self._y + self._height
 
+    @property
+    def width(self):
+        return self._width
+
+    @property
+    def height(self):
+        return self._height
+
+    # the vector is cached and shared, and follows the object when it moves, copy it to keep it
+    # or before changing it
     @property
     def center(self):
-        return pgm.Vector2(self.rect.centerx, self.rect.centery)
+        if self._stale:
+            self.refresh()
+        if self._center is None:
+            self._center = pgm.Vector2(self._x + self._width / 2, self._y + self._height / 2)
+        return self._center
+
+    # rectangle of the object, rounded to whole pixels, shared like the center
+    @property
+    def rect(self):
+        if self._stale:
+            self.refresh()
+        if self._rect is None:
+            self._rect = pygame.Rect(round(self._x), round(self._y), round(self._width), round(self._height))
+        return self._rect
+
+    # bring the cached rect and center in line with the position after a move
+    def refresh(self):
+        self._stale = False
+        if self._rect is not None:
+            self._rect.update(round(self._x), round(self._y), round(self._width), round(self._height))
+        if self._center is not None:
+            self._center.update(self._x + self._width / 2, self._y + self._height / 2)
+
+    @rect.setter
+    def rect(self, value):
+        self._x = value.x
+        self._y = value.y
+        self._width = value.width
+        self._height = value.height
+        self._rect = None
+        self._center = None
+        self._stale = False
 
     def __init__(self, x, y, width, height, color):
         self.rect = pygame.Rect(x, y, width, height)
+        self._x = x
+        self._y = y
         self.color = color
     
     # draw the object
     def draw(self, screen):
         pygame.draw.rect(screen, self.color, self.rect)
 
-    # relative move function that moves the rect based on the x and y parameters
+    # relative move function that moves the object based on the x and y parameters
     def move_by(self, dx, dy):
-        self.rect.x += dx
-        self.rect.y += dy
+        self._x += dx
+        self._y += dy
+        self._stale = True
 
-    # absolute move function that moves the rect to the x and y parameters
+    # absolute move function that moves the object to the x and y parameters
     def move_to(self, x, y):
-        self.rect.x = x
-        self.rect.y = y
+        self._x = x
+        self._y = y
+        self._stale = True
 
     # destroy the object
     def destroy(self):
@@ -69,59 +124,259 @@ class Drawable:
 
 # Physical class that inherits from Drawable, and contains vx and vy variables to track velocity
 # It contains additional methods to add velocity and move the object based on it's velocity
+# Objects belong to the World they are created in, see world.World.add
+# An object made with a world reuses an object of the same class from the world's EntityPool when
+# there is one, __init__ then runs again on it
 class Physical(Drawable):
 
-    all_objects=[]
+    __slots__ = ("_store", "_index", "mass", "_imass", "_restitution", "_velocity", "_locked", "_sleeping",
+                 "sleep_time", "island", "island_root", "island_time", "solver_index", "alive", "baked_into",
+                 "world", "entity_id")
+
+    # shape used for collisions, see shapes.py
+    shape = shapes.AABB
+
+    # collision layer and the layers the object collides with, see layers.py
+    layer = layers.DEFAULT
+    mask = layers.ALL
+
+    # sensors only report overlaps through the on_trigger_ methods, they get no physics response
+    sensor = False
 
-    def __init__(self, x, y, width, height, color, vx=0, vy=0):
+    def __new__(cls, *args, world=None, **kwargs):
+        if world is not None:
+            obj = world.pool.take(cls)
+            if obj is not None:
+                return obj
+        return super().__new__(cls)
+
+    # objects made without a world are not simulated, the static geometry uses those for its pieces
+    # Objects in a world's BodyStore are views, their state lives in the store's arrays
+    def __init__(self, x, y, width, height, color, vx=0, vy=0, world=None):
+        self._store = None
+        self._index = None
         super().__init__(x, y, width, height, color)
         self.mass = width * height
         self.imass = 1 / self.mass
         self.restitution = 0.25
         self.velocity = pgm.Vector2(vx, vy)
         self.locked = False
-        Physical.all_objects.append(self)
-            
+        self.sleeping = False
+        # how long the object has been moving slowly enough to sleep, and the island it sleeps with
+        self.sleep_time = 0.0
+        self.island = None
+        # used by World.update_sleep to find the islands each step
+        self.island_root = None
+        self.island_time = 0.0
+        # where the object is in the bodies the solver works on, see solver.index_of
+        self.solver_index = None
+        self.alive = True
+        # StaticGeometry the object is baked into, baked objects are not in the world's bodies
+        self.baked_into = None
+        # id from the world's registry.Registry while the object is in a world
+        self.entity_id = None
+        self.world = world
+        if world is not None:
+            world.add(self)
+
+    # state that is kept in the body store when the object is in one
+    # The position is kept on the object as well, every move writes it to both, and the store hands
+    # the rows it moves itself back to their objects, see bodystore.BodyStore.moved, so reading it,
+    # the rect and the center costs no array access
+    @Drawable.rect.setter
+    def rect(self, value):
+        Drawable.rect.fset(self, value)
+        if self._store is not None:
+            self._store.position[self._index] = value.x, value.y
+            self._store.size[self._index] = value.width, value.height
+
+    # for an object in the store the vector is filled in from its row on every read, changing it does
+    # not change the row, set velocity (or use add_velocity and set_velocity) for that
+    @property
+    def velocity(self):
+        if self._store is None:
+            return self._velocity
+        row = self._store.velocity
+        self._velocity.update(row.item(self._index, 0), row.item(self._index, 1))
+        return self._velocity
+
+    @velocity.setter
+    def velocity(self, value):
+        if self._store is None:
+            self._velocity = value
+        else:
+            self._store.velocity[self._index] = value.x, value.y
+
+    # imass, restitution and the locked and sleeping flags are kept on the object as well, so reading
+    # them costs no array access, setting them writes them through to the store
+    @property
+    def imass(self):
+        return self._imass
+
+    @imass.setter
+    def imass(self, value):
+        self._imass = value
+        if self._store is not None:
+            self._store.imass[self._index] = value
+
+    @property
+    def restitution(self):
+        return self._restitution
+
+    @restitution.setter
+    def restitution(self, value):
+        self._restitution = value
+        if self._store is not None:
+            self._store.restitution[self._index] = value
+
+    @property
+    def locked(self):
+        return self._locked
+
+    @locked.setter
+    def locked(self, value):
+        self._locked = value
+        if self._store is not None:
+            self._store.locked[self._index] = value
+
+    @property
+    def sleeping(self):
+        return self._sleeping
+
+    @sleeping.setter
+    def sleeping(self, value):
+        self._sleeping = value
+        if self._store is not None:
+            self._store.sleeping[self._index] = value
+
+    # locked and sleeping objects do not move, the broadphase treats both as static
+    @property
+    def resting(self):
+        return self.locked or self.sleeping
+
+    # put the object to sleep together with the other objects of its island
+    def sleep(self, island):
+        self.sleeping = True
+        self.sleep_time = 0.0
+        self.island = island
+        self.velocity = pgm.Vector2(0, 0)
+        self.world.sleeping.add(self)
+
+    # wake the object and every object it fell asleep with
+    def wake(self):
+        if not self.sleeping:
+            return
+        for body in self.island or [self]:
+            body.sleeping = False
+            body.sleep_time = 0.0
+            body.island = None
+            self.world.sleeping.discard(body)
+
+    # relative move function, writes to the body store when the object is in one
+    def move_by(self, dx, dy):
+        super().move_by(dx, dy)
+        if self._store is not None:
+            self._store.position[self._index] = self._x, self._y
+
+    # absolute move function, writes to the body store when the object is in one
+    def move_to(self, x, y):
+        super().move_to(x, y)
+        if self._store is not None:
+            self._store.position[self._index] = x, y
+
     # move the object based on it's velocity
-    # collision_handler is a function that takes in a collision object and handles the collision
-    def step(self):
-        self.move_by(self.velocity.x, self.velocity.y)
-        self.velocity.x *= 0.8
+    # scale is the length of the step in ticks, the x damping is applied per tick
+    def step(self, scale=1.0):
+        if self._store is not None:
+            velocity = self._store.velocity[self._index]
+            self._store.position[self._index] += velocity * scale
+            velocity[0] *= 0.8 ** scale
+            self._store.moved([self._index])
+            return
+        self.move_by(self.velocity.x * scale, self.velocity.y * scale)
+        self.velocity.x *= 0.8 ** scale
 
-    # add velocity
+    # add velocity, wakes the object up
     def add_velocity(self, vx=None, vy=None):
+        if self.sleeping and (vx or vy):
+            self.wake()
+        if self._store is not None:
+            velocity = self._store.velocity[self._index]
+            if vx is not None:
+                velocity[0] += vx
+            if vy is not None:
+                velocity[1] += vy
+            return
         if vx is not None:
             self.velocity.x += vx
         if vy is not None:   
             self.velocity.y += vy
 
-    # add velocity
+    # set velocity, wakes the object up
     def set_velocity(self, vx=None, vy=None):
+        if self.sleeping and (vx or vy):
+            self.wake()
+        if self._store is not None:
+            velocity = self._store.velocity[self._index]
+            if vx is not None:
+                velocity[0] = vx
+            if vy is not None:
+                velocity[1] = vy
+            return
         if vx is not None:
             self.velocity.x = vx
         if vy is not None:
             self.velocity.y = vy
 
-    # destroy the object
+    # destroy the object, during a step the world takes it out when the step is over
     def destroy(self):
-        Physical.all_objects.remove(self)
+        self.alive = False
+        if self.world is not None:
+            self.world.destroy(self)
 
     # resolve the collision effects within the class
     def hit_by(self, other, collision_vector: pgm.Vector2):
         pass
 
+    # a sensor started overlapping this object, or this sensor started overlapping other
+    def on_trigger_enter(self, other):
+        pass
+
+    # the overlap with a sensor goes on
+    def on_trigger_stay(self, other):
+        pass
+
+    # the overlap with a sensor ended
+    def on_trigger_exit(self, other):
+        pass
+
 # Goal class that represents the goal in the game
+# Goals are triggers, touching one only lets the player know, it does not push the player back
 class Goal(Physical):
-    def __init__(self, x, y, width=40, height=80, color=(255,255,255)):
-        super().__init__(x, y, width, height, color)
+
+    __slots__ = ()
+
+    shape = shapes.TRIGGER
+    sensor = True
+    layer = layers.PICKUP
+    mask = layers.PLAYER
+
+    def __init__(self, x, y, width=40, height=80, color=(255,255,255), world=None):
+        super().__init__(x, y, width, height, color, world=world)
         self.locked = True
 
 # player class that represents the player in the game
 # This class inherits from Drawable, which is an example of polymorphism
 class Player(Physical):
+
+    __slots__ = ("standing", "score", "health")
+
+    draw_shape = "ellipse"
+    shape = shapes.CIRCLE
+    layer = layers.PLAYER
     
-    def __init__(self, x, y, width, height, color, vx=0, vy=0):
-        super().__init__(x, y, width, height, color, vx, vy)
+    def __init__(self, x, y, width, height, color, vx=0, vy=0, world=None):
+        super().__init__(x, y, width, height, color, vx, vy, world)
         self.standing = False
         self.mass = math.pi * (width / 2) ** 2
         self.imass = 1 / self.mass
@@ -133,11 +388,11 @@ class Player(Physical):
         if isinstance(other, Wall):
             # if the collision vector is pointing up, set the y velocity to 0, and standing to true
             if collision_vector.y == 1.0 and not self.standing:
-                self.vy = 0
                 self.standing = True
 
+    def on_trigger_enter(self, other):
+        # pick up the goal
         if isinstance(other, Goal):
-            # if the collision vector is pointing up, set the y velocity to 0, and standing to true
             self.score += 1
             other.destroy()
         
@@ -148,47 +403,108 @@ class Player(Physical):
 
 
 # wall class that represents a wall in the game
+# The walls of a world are kept in its walls view and in its wall_index (a wallindex.WallIndex
+# by column and row), used to find the walls a wall can merge with
 class Wall(Physical):
-    list_of_walls = []
-
-    def try_merge_walls():
-        removed_walls = []
-        # Use combinations to get all possible pairs from all_objects
-        for obj1, obj2 in combinations(Wall.list_of_walls, 2):
-            # if removed_walls does not contian obj1 and obj2
-            if obj2 in removed_walls:
-                continue
-            if obj1.x == obj2.x and (abs(obj1.y - obj2.y) == 20 or abs(obj1.bottom - obj2.bottom) == 20):
-                if obj1.merge(obj2):
-                    removed_walls.append(obj2)
-                    # change to brown
-                    obj1.color = (139, 69, 19)
-        if len(removed_walls) > 0:
-            Wall.try_merge_walls()
 
-    def __init__(self, x, y, width, height, color):
-        super().__init__(x, y, width, height, color, 0, 0)
+    __slots__ = ("owner",)
+
+    layer = layers.WORLD
+
+    # merge a newly placed wall with the walls that touch it end to end, vertically and horizontally
+    # the wall that absorbed it keeps merging with its own neighbours until nothing touches it
+    # Only walls with the same owner merge, see __init__
+    # returns the wall that is left
+    def merge_neighbours(wall):
+        index = wall.world.wall_index
+        neighbour = index.neighbour(wall)
+        while neighbour is not None:
+            neighbour.merge(wall)
+            # change to brown
+            neighbour.color = (139, 69, 19)
+            wall = neighbour
+            neighbour = index.neighbour(wall)
+        return wall
+
+    # merge every wall of a world that touches another wall end to end
+    def try_merge_walls(world):
+        for wall in list(world.walls):
+            if wall.alive:
+                Wall.merge_neighbours(wall)
+
+    def __init__(self, x, y, width, height, color, world=None):
+        super().__init__(x, y, width, height, color, 0, 0, world)
         self.locked = True
         self.mass = 1000000
-        Wall.list_of_walls.append(self)
+        # what the wall belongs to, for example the chunks.Chunk it was loaded with, walls only merge
+        # with walls of the same owner, so a merged wall never belongs to two of them
+        self.owner = None
+        if world is not None:
+            world.wall_index.add(self)
+            self.wake_touching(self.rect)
+
+    # wake the sleeping objects that touch a rect, called when walls appear, change or go away
+    def wake_touching(self, rect):
+        area = rect.inflate(2, 2)
+        for body in list(self.world.sleeping):
+            if body.rect.colliderect(area):
+                body.wake()
 
     # function that merges two walls together
+    # walls merge when they have the same column and touch top to bottom,
+    # or when they have the same row and touch side to side
     def merge(self, other):
-        # if this wall is above the other wall
-        if self.bottom == other.top and self.rect.width == other.rect.width and self.rect.x == other.rect.x:
-            self.rect.height += other.rect.height
-            self.mass += other.mass
-            other.destroy()
-            return True
-        # if this wall is below the other wall
-        elif self.top == other.bottom and self.rect.width == other.rect.width and self.rect.x == other.rect.x:
-            self.rect.height += other.rect.height
-            self.rect.y = other.rect.y
-            self.mass += other.mass
-            other.destroy()
-            return True
-        return False
+        vertical = self.rect.x == other.rect.x and self.rect.width == other.rect.width \
+            and (self.bottom == other.top or self.top == other.bottom)
+        horizontal = self.rect.y == other.rect.y and self.rect.height == other.rect.height \
+            and (self.right == other.left or self.left == other.right)
+        if not (vertical or horizontal):
+            return False
+
+        self.world.wall_index.remove(self)
+        self.rect = self.rect.union(other.rect)
+        self.mass += other.mass
+        other.destroy()
+        self.world.wall_index.add(self)
+        if self.baked_into is not None:
+            self.baked_into.update(self)
+        self.wake_touching(self.rect)
+        return True
     
     def destroy(self):
-        Wall.list_of_walls.remove(self)
-        Physical.all_objects.remove(self)
+        if not self.alive:
+            return
+        if self.world is not None:
+            self.world.wall_index.remove(self)
+            self.wake_touching(self.rect)
+        super().destroy()
+
+
+# EntityPool class that keeps the objects of a cleared world so the next scene can reuse them
+# World.clear releases every object of the world into its pool, Physical.__new__ takes them back
+# out by class, so setting up a scene mostly re-initializes objects instead of allocating them
+class EntityPool:
+    def __init__(self):
+        self.free = {}
+
+    def __len__(self):
+        return sum(len(objs) for objs in self.free.values())
+
+    def clear(self):
+        self.free.clear()
+
+    # keep an object that is no longer in any world, it counts as destroyed until it is reused
+    def release(self, obj):
+        obj.alive = False
+        obj.world = None
+        obj.baked_into = None
+        obj.island = None
+        obj.entity_id = None
+        self.free.setdefault(type(obj), []).append(obj)
+
+    # an object of exactly this class to reuse, or None
+    def take(self, cls):
+        objs = self.free.get(cls)
+        if objs:
+            return objs.pop()
+        return None
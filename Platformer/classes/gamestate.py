@@ -1,15 +1,72 @@
+import os
 import pygame
+from . import world, broadphase, renderer, solver, controllers, profiler, camera
 
 class GameState:
-    def __init__(self):
+    # headless=True runs without a window, for tests and benchmarks on machines without a display
+    # The physics options are arguments because the world is built from them right here, setting the
+    # attributes afterwards does not change the world
+    def __init__(self, headless=False, tick_rate=60, use_body_store=False, batch_narrowphase=False,
+                 sweep_and_prune=False, solver_iterations=4, continuous_collisions=True, compiled_levels=False):
+        self.headless = headless
+        if headless:
+            # SDL's dummy video driver lets pygame run without a display
+            os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
         # Initialize pygame when this class is instantiated
         pygame.init()
         self.WIDTH, self.HEIGHT = 800, 600
-        self.screen = pygame.display.set_mode((self.WIDTH, self.HEIGHT))
+        if headless:
+            # draw into an off-screen surface instead of a window
+            self.screen = pygame.Surface((self.WIDTH, self.HEIGHT))
+        else:
+            self.screen = pygame.display.set_mode((self.WIDTH, self.HEIGHT))
         self.clock = pygame.time.Clock()
         # set up game loop variable, may move this to a function later
         self.running = True
         # set FPS to something reasonable
         self.FPS = 60
         # other setup stuff, will move this to a function later
-        self.GRAVITY = 0.25
\ No newline at end of file
+        self.GRAVITY = 0.25
+        # size of the grid that walls are built on, also used as the broadphase cell size
+        self.GRID_SIZE = 20
+        # the simulation runs on its own fixed tick rate, separate from FPS
+        self.TICK_RATE = tick_rate
+        # keep body state in numpy arrays (needs numpy), off by default
+        self.USE_BODY_STORE = use_body_store
+        # run the narrowphase for all contacts at once with numpy (needs numpy), off by default
+        self.BATCH_NARROWPHASE = batch_narrowphase
+        # find the pairs with an incremental sweep and prune instead of the spatial hash, for levels
+        # with objects of very different sizes, off by default
+        self.SWEEP_AND_PRUNE = sweep_and_prune
+        # iterations of the contact solver per tick
+        self.SOLVER_ITERATIONS = solver_iterations
+        # sweep fast bodies so they can't pass through thin walls, lets the tick rate go down
+        self.CONTINUOUS_COLLISIONS = continuous_collisions
+        # load scenes from the level files export_levels.py writes when they are up to date, off by
+        # default, see scenes.Scene.load_compiled
+        self.COMPILED_LEVELS = compiled_levels
+        # run the physics on its own thread while the main thread draws, see simthread.py
+        # headless runs step the world themselves, so only the game uses it
+        self.THREADED_SIMULATION = not headless
+        # times the phases of every frame, off until toggled (F3 in game), see profiler.Profiler
+        self.profiler = profiler.Profiler()
+        # world that owns the physics bodies of the current scene
+        self.world = world.World(gravity=self.GRAVITY, tick_rate=self.TICK_RATE,
+                                 backend=broadphase.SweepAndPrune() if self.SWEEP_AND_PRUNE
+                                 else broadphase.SpatialHash(cell_size=self.GRID_SIZE),
+                                 use_store=self.USE_BODY_STORE,
+                                 batch_narrowphase=self.BATCH_NARROWPHASE,
+                                 solver=solver.Solver(iterations=self.SOLVER_ITERATIONS),
+                                 ccd=self.CONTINUOUS_COLLISIONS,
+                                 profile=self.profiler)
+        # renderer that redraws only the parts of the screen that changed
+        self.renderer = renderer.DirtyRenderer(profile=self.profiler)
+        # part of the world that is on the screen, scenes bigger than the screen give it a target
+        self.camera = camera.Camera(self.WIDTH, self.HEIGHT)
+        # chunks.ChunkMap of scenes that stream their level from disk
+        self.chunks = None
+        # simthread.SimulationThread of the current scene, while it runs
+        self.simulation = None
+        # input of the current frame, and the recording.Recording it is saved to when recording
+        self.input = controllers.Input()
+        self.recorder = None
\ No newline at end of file
@@ -0,0 +1,83 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from . import controllers, scenes, gamestate
+
+
+# Stats class that collects what happened during a headless run
+class Stats:
+    def __init__(self):
+        self.ticks = 0
+        self.seconds = 0.0
+        self.pairs_tested = 0
+        self.contacts_resolved = 0
+
+    @property
+    def ticks_per_second(self):
+        return self.ticks / self.seconds if self.seconds > 0 else float("inf")
+
+    @property
+    def pairs_per_tick(self):
+        return self.pairs_tested / self.ticks if self.ticks else 0.0
+
+    @property
+    def contacts_per_tick(self):
+        return self.contacts_resolved / self.ticks if self.ticks else 0.0
+
+
+# run a scene for a number of ticks as fast as possible, without events, drawing or the clock
+# inputs is a sequence of controllers.Input, one per tick, ticks past its end get an empty Input
+# Every tick is one fixed World.step, so two runs with the same inputs give the same result
+def run(scene: scenes.Scene, inputs=(), ticks=600, setup=True):
+    game_state = scene.game_state
+    world = game_state.world
+    if setup:
+        scene.setup()
+
+    inputs = list(inputs)
+    idle = controllers.Input()
+    stats = Stats()
+
+    start = time.perf_counter()
+    for tick in range(ticks):
+        game_state.input = inputs[tick] if tick < len(inputs) else idle
+        game_state.character_controller.set_input(game_state.input)
+        world.step()
+        scenes.update_view(game_state)
+        stats.pairs_tested += world.pairs_tested
+        stats.contacts_resolved += world.contacts_resolved
+    stats.seconds = time.perf_counter() - start
+    stats.ticks = ticks
+
+    return stats
+
+
+# Result class with the end state of a rollout, small enough to send back from a worker process
+class Result:
+    def __init__(self, score, position, velocity, stats):
+        self.score = score
+        self.position = position
+        self.velocity = velocity
+        self.stats = stats
+
+
+# run one scene from setup in a fresh headless GameState and report how its player ended up
+# scene_class has to be importable by name (not defined inside a function) to run in another process
+# options are the physics options of the GameState, see gamestate.GameState
+def rollout(scene_class, inputs, ticks=600, options=None):
+    game_state = gamestate.GameState(headless=True, **(options or {}))
+    scene = scene_class(game_state)
+    stats = run(scene, inputs, ticks)
+    player = scene.player
+    return Result(player.score, (float(player.x), float(player.y)),
+                  (float(player.velocity.x), float(player.velocity.y)), stats)
+
+
+# run one rollout per recorded input sequence across a pool of worker processes
+# Every rollout has its own GameState and World, so they don't share any state and the results
+# are the same as running them one after the other, returned in the order of input_sequences
+# workers defaults to the number of cores, options are handed to every rollout
+def run_parallel(scene_class, input_sequences, ticks=600, workers=None, options=None):
+    input_sequences = [list(inputs) for inputs in input_sequences]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(rollout, repeat(scene_class), input_sequences, repeat(ticks), repeat(options)))
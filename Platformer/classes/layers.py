@@ -0,0 +1,14 @@
+# Collision layers, every Physical is on one layer (a bit) and has a mask of the layers it collides with
+# Two objects only collide when each one's layer is in the other's mask, the broadphase rejects
+# every other pair before testing their rectangles
+DEFAULT = 1 << 0
+WORLD = 1 << 1
+PLAYER = 1 << 2
+PICKUP = 1 << 3
+
+ALL = 0xFFFFFFFF
+
+
+# whether two objects are allowed to collide
+def can_collide(a, b):
+    return (a.layer & b.mask) != 0 and (b.layer & a.mask) != 0
@@ -0,0 +1,167 @@
+import array
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from . import entities, gamestate
+
+# Compiled level files, the entities of a scene after its setup, stored as packed arrays
+#
+# The file starts with a header
+#   magic b"PGLV", format version, entity count, level width and height, and the source hash
+# followed by three arrays with one entry per entity
+#   rects   int32 x, y, width, height
+#   colors  uint8 r, g, b, a
+#   kinds   uint8, one of the KIND_ values
+# all little endian
+#
+# Files are opened with mmap and read through memoryviews, on big endian machines the rects are
+# copied and byte swapped instead, walls go straight from the file
+# into the world's static geometry as plain rects, without a Wall object per wall
+# Only the few bodies that move or react to the player (goals, the player) become objects
+# The source hash is a hash of the code in this package (the scenes, the entities and this exporter)
+# at the time the file was written, a file whose hash does not match the code is stale
+
+MAGIC = b"PGLV"
+VERSION = 2
+PREFIX = struct.Struct("<4sH")
+HEADER = struct.Struct("<4sHIII32s")
+
+KIND_WALL = 0
+KIND_GOAL = 1
+KIND_PLAYER = 2
+
+
+# LevelFile class, an open level file, the arrays are memoryviews into the mapped file
+class LevelFile:
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = PREFIX.unpack_from(self.map)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a level file")
+        if version != VERSION:
+            self.close()
+            raise ValueError(f"unsupported level file version {version}")
+        _, _, self.count, self.width, self.height, self.source_hash = HEADER.unpack_from(self.map)
+
+        view = memoryview(self.map)
+        offset = HEADER.size
+        self.rects = view[offset:offset + self.count * 16].cast("i")
+        if sys.byteorder != "little":
+            swapped = array.array("i", self.rects)
+            swapped.byteswap()
+            self.rects.release()
+            self.rects = memoryview(swapped)
+        offset += self.count * 16
+        self.colors = view[offset:offset + self.count * 4]
+        offset += self.count * 4
+        self.kinds = view[offset:offset + self.count]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # whether the file was written by the code that is running now
+    @property
+    def fresh(self):
+        return self.source_hash == source_hash()
+
+    def close(self):
+        for name in ("rects", "colors", "kinds"):
+            view = getattr(self, name, None)
+            if view is not None:
+                view.release()
+        self.map.close()
+        self.file.close()
+
+    def rect(self, i):
+        return tuple(self.rects[i * 4:i * 4 + 4])
+
+    def color(self, i):
+        return tuple(self.colors[i * 4:i * 4 + 3])
+
+    # load the level into a world, walls are baked as plain rects, returns the player if there is one
+    def load_into(self, world):
+        kinds = self.kinds
+        walls = [i for i in range(self.count) if kinds[i] == KIND_WALL]
+        world.static.add_rects([self.rect(i) for i in walls], [self.color(i) for i in walls])
+
+        player = None
+        for i in range(self.count):
+            kind = kinds[i]
+            if kind == KIND_GOAL:
+                x, y, width, height = self.rect(i)
+                entities.Goal(x, y, width, height, self.color(i), world=world)
+            elif kind == KIND_PLAYER:
+                x, y, width, height = self.rect(i)
+                player = entities.Player(x, y, width, height, self.color(i), world=world)
+        world.static.rebuild()
+        return player
+
+
+# sha256 of the source files of this package, worked out once
+_source_hash = None
+
+
+def source_hash():
+    global _source_hash
+    if _source_hash is None:
+        digest = hashlib.sha256()
+        folder = os.path.dirname(os.path.abspath(__file__))
+        for name in sorted(os.listdir(folder)):
+            if name.endswith(".py"):
+                digest.update(name.encode())
+                with open(os.path.join(folder, name), "rb") as file:
+                    digest.update(file.read())
+        _source_hash = digest.digest()
+    return _source_hash
+
+
+# the kind of an entity, or None for entities that can't be stored
+def kind_of(obj):
+    if isinstance(obj, entities.Goal):
+        return KIND_GOAL
+    if isinstance(obj, entities.Player):
+        return KIND_PLAYER
+    if isinstance(obj, entities.Wall) and obj.locked:
+        return KIND_WALL
+    return None
+
+
+# write a level file with a list of (rect, color, kind) entries
+def write(path, entries, width=0, height=0):
+    data = bytearray(HEADER.pack(MAGIC, VERSION, len(entries), width, height, source_hash()))
+    for rect, color, kind in entries:
+        data += struct.pack("<4i", *rect)
+    for rect, color, kind in entries:
+        data += bytes(tuple(color)[:3]) + b"\xff"
+    for rect, color, kind in entries:
+        data.append(kind)
+    with open(path, "wb") as file:
+        file.write(data)
+
+
+# run the setup of a scene in a headless game and write what it built to a level file
+# Baked walls, walls, goals and players are stored, anything else is left out
+def export(scene_class, path):
+    game_state = gamestate.GameState(headless=True)
+    scene = scene_class(game_state)
+    scene.use_compiled = False
+    scene.setup()
+    world = game_state.world
+
+    entries = []
+    for wall, rect in world.static.walls.items():
+        color = world.static.colors[wall] if isinstance(wall, int) else wall.color
+        entries.append((tuple(rect), color, KIND_WALL))
+    for obj in world.bodies:
+        kind = kind_of(obj)
+        if kind is not None:
+            entries.append((tuple(obj.rect), obj.color, kind))
+    write(path, entries, game_state.WIDTH, game_state.HEIGHT)
+    return len(entries)
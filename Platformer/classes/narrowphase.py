@@ -0,0 +1,167 @@
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, without it only the scalar functions in physics can be used
+    np = None
+
+from . import shapes
+
+
+# Batch versions of the narrowphase functions in physics.py
+# Instead of one Manifold at a time they take an (n, 4) float array of the x, y, width and height
+# of the objects (their float positions and sizes, not their rounded rects) and two arrays of pair
+# indices into it, and test every pair in one numpy pass
+# Each returns a hit mask, the penetration and the (k, 2) normals for all pairs
+# The math follows the scalar functions step for step so the results are identical,
+# the scalar functions stay the reference path
+
+# below this many pairs the fixed cost of the numpy calls is more than running the scalar functions
+MIN_BATCH = 32
+
+
+# build the (n, 4) rect array for a list of objects
+# The rows of objects in a bodystore.BodyStore are copied from its arrays in one go, the others
+# (static pieces, or every object when there is no store) are filled in from one list
+def gather_rects(list_of_objects):
+    rects = np.empty((len(list_of_objects), 4))
+    store = None
+    slots = []
+    rows = []
+    others = []
+    other_rects = []
+    for i, obj in enumerate(list_of_objects):
+        if obj._store is None:
+            others.append(i)
+            other_rects.append((obj._x, obj._y, obj._width, obj._height))
+        else:
+            store = obj._store
+            slots.append(i)
+            rows.append(obj._index)
+    if rows:
+        rects[slots, :2] = store.position[rows]
+        rects[slots, 2:] = store.size[rows]
+    if others:
+        rects[others] = other_rects
+    return rects
+
+
+# centers of the rects, the same centers Drawable.center gives
+def centers(rects):
+    return np.stack((rects[:, 0] + rects[:, 2] / 2, rects[:, 1] + rects[:, 3] / 2), axis=1)
+
+
+# batch aabb_vs_aabb, A and B are boxes
+def aabb_vs_aabb(rects, ia, ib):
+    center = centers(rects)
+    vector = center[ib] - center[ia]
+    half = rects[:, 2:4] / 2
+
+    # overlap on both axes
+    overlap = half[ia] + half[ib] - np.abs(vector)
+    x_overlap = overlap[:, 0]
+    y_overlap = overlap[:, 1]
+    hit = (x_overlap > 0) & (y_overlap > 0)
+
+    # pick the axis of least penetration, normal points from A to B
+    use_x = x_overlap < y_overlap
+    normal = np.zeros((len(ia), 2))
+    normal[use_x, 0] = np.where(vector[use_x, 0] < 0, -1.0, 1.0)
+    normal[~use_x, 1] = np.where(vector[~use_x, 1] < 0, -1.0, 1.0)
+    penetration = np.where(use_x, x_overlap, y_overlap)
+
+    return hit, np.where(hit, penetration, 0.0), normal
+
+
+# batch circle_vs_circle, A and B are circles with a diameter of their rect width
+def circle_vs_circle(rects, ia, ib):
+    center = centers(rects)
+    vector = center[ib] - center[ia]
+    radius = rects[:, 2] / 2
+
+    r = radius[ia] + radius[ib]
+    length_squared = vector[:, 0] * vector[:, 0] + vector[:, 1] * vector[:, 1]
+    hit = length_squared <= r * r
+
+    d = np.sqrt(length_squared)
+    apart = d != 0
+    safe_d = np.where(apart, d, 1.0)
+
+    # circles on the same position get a consistent normal and penetration
+    # pygame divides a vector by multiplying with the reciprocal, do the same
+    penetration = np.where(apart, r - d, radius[ia])
+    normal = np.where(apart[:, None], vector * (1 / safe_d)[:, None], np.array([1.0, 0.0]))
+
+    return hit, np.where(hit, penetration, 0.0), normal
+
+
+# batch aabb_vs_circle, A is the box and B the circle
+def aabb_vs_circle(rects, ia, ib):
+    center = centers(rects)
+    vector = center[ib] - center[ia]
+    x_extent = rects[ia, 2] / 2
+    y_extent = rects[ia, 3] / 2
+
+    # closest point on the box to the center of the circle
+    closest_x = np.maximum(-x_extent, np.minimum(x_extent, vector[:, 0]))
+    closest_y = np.maximum(-y_extent, np.minimum(y_extent, vector[:, 1]))
+
+    # the center is inside the box, clamp the closest point to the closest edge
+    inside = (vector[:, 0] == closest_x) & (vector[:, 1] == closest_y)
+    along_x = inside & (np.abs(vector[:, 0]) < np.abs(vector[:, 1]))
+    along_y = inside & ~along_x
+    closest_x = np.where(along_x, np.where(closest_x > 0, x_extent, -x_extent), closest_x)
+    closest_y = np.where(along_y, np.where(closest_y > 0, y_extent, -y_extent), closest_y)
+
+    normal = np.stack((vector[:, 0] - closest_x, vector[:, 1] - closest_y), axis=1)
+    d = normal[:, 0] * normal[:, 0] + normal[:, 1] * normal[:, 1]
+    zero = d == 0
+    normal[zero] = 0.0, 1.0
+    d[zero] = 1.0
+    r = rects[ib, 2] / 2
+
+    hit = inside | (d <= r * r)
+
+    # normalize the same way pygame does, with sqrt, the penetration uses ** 0.5 like the scalar version
+    normal = normal / np.sqrt(d)[:, None]
+    normal[inside] *= -1
+    d = d ** 0.5
+    penetration = r - d
+
+    return hit, np.where(hit, penetration, 0.0), normal
+
+
+# test all candidate pairs, grouped by shape type
+# kinds holds the shapes.py shape kind of every rect, pairs of one box and one circle are
+# swapped so the box comes first, the same way the shapes dispatch table does it
+# triggers are tested as boxes
+# returns the (possibly swapped) pair indices, the hit mask, penetrations and normals
+def collide(rects, kinds, ia, ib):
+    ia = np.array(ia, dtype=np.intp)
+    ib = np.array(ib, dtype=np.intp)
+    count = len(ia)
+    hit = np.zeros(count, dtype=bool)
+    penetration = np.zeros(count)
+    normal = np.zeros((count, 2))
+
+    a_kind = kinds[ia]
+    b_kind = kinds[ib]
+    a_circle = a_kind == shapes.CIRCLE
+    b_circle = b_kind == shapes.CIRCLE
+    a_box = a_kind == shapes.AABB
+    b_box = b_kind == shapes.AABB
+
+    # put the box first in mixed pairs
+    swap = a_circle & b_box
+    ia[swap], ib[swap] = ib[swap], ia[swap]
+
+    circles = a_circle & b_circle
+    mixed = (a_circle & b_box) | (a_box & b_circle)
+    groups = (
+        (circles, circle_vs_circle),
+        (mixed, aabb_vs_circle),
+        (~circles & ~mixed, aabb_vs_aabb),
+    )
+    for mask, handler in groups:
+        if mask.any():
+            hit[mask], penetration[mask], normal[mask] = handler(rects, ia[mask], ib[mask])
+
+    return ia, ib, hit, penetration, normal
@@ -1,51 +1,160 @@
-from itertools import combinations
 import pygame.math as pgm
 import pygame
 import math
-from . import entities
+from . import entities, narrowphase, shapes
 
 
 
 # Manifold class that contains the two objects that collided, the penetration depth, and the normal
 class Manifold:
+
+    __slots__ = ("A", "B", "Penetration", "Normal", "Trigger")
+
     def __init__(self, A, B):
+        self.reset(A, B)
+
+    # start over with a new pair of objects, used when a ManifoldPool reuses the manifold
+    def reset(self, A, B):
         self.A : entities.Physical = A
         self.B : entities.Physical = B
         self.Penetration = 0
         self.Normal = None
+        # set when one of the bodies is a sensor, the contact is reported but not resolved
+        self.Trigger = False
+
+
+# ManifoldPool class that hands out Manifolds and takes them all back at once
+# A world releases every manifold at the start of a step, so once the pool has grown to the
+# number of pairs a step needs, no more Manifolds are made
+# A manifold is only valid until the next release_all, keep what is needed from it instead
+class ManifoldPool:
+    def __init__(self):
+        self.manifolds = []
+        self.used = 0
+
+    def __len__(self):
+        return len(self.manifolds)
+
+    def acquire(self, A, B):
+        if self.used < len(self.manifolds):
+            m = self.manifolds[self.used]
+            m.reset(A, B)
+        else:
+            m = Manifold(A, B)
+            self.manifolds.append(m)
+        self.used += 1
+        return m
+
+    def release_all(self):
+        self.used = 0
+
+# normals along the axes, shared by every contact that has one, so never change them in place
+NORMAL_LEFT = pgm.Vector2(-1, 0)
+NORMAL_RIGHT = pgm.Vector2(1, 0)
+NORMAL_UP = pgm.Vector2(0, -1)
+NORMAL_DOWN = pgm.Vector2(0, 1)
 
 # generate_collision_pairs takes in a list of objects and returns a list of collision Manifold objects
-def generate_collision_pairs(list_of_objects):
-    collision_pair_manifolds : list(Manifold) = []
-
-    # Use combinations to get all possible pairs from all_objects
-    for obj1, obj2 in combinations(list_of_objects, 2):
-        if obj1.rect.colliderect(obj2.rect):  # Check if rectangles collide
-            if obj1.locked and obj2.locked:  # If both objects are static, skip
-                continue
+# the candidate pairs come from the backend broadphase, which keeps state between calls, so every world
+# passes its own
+# with a ManifoldPool the manifolds are taken from it instead of made new, and with a list given they
+# are added to the end of it instead of a new one
+def generate_collision_pairs(list_of_objects, backend, pool=None, collision_pair_manifolds=None):
+    if collision_pair_manifolds is None:
+        collision_pair_manifolds : list(Manifold) = []
+
+    for obj1, obj2 in backend.find_pairs(list_of_objects):
+        if pool is not None:
+            collision_pair_manifolds.append(pool.acquire(obj1, obj2))
+        else:
             collision_pair_manifolds.append(Manifold(A=obj1, B=obj2))  # If they collide, add them as a pair
 
     return collision_pair_manifolds
 
 
-# resolve_collision_pairs takes in a list of collision Manifold objects and runs aabb_vs_aabb on them
-# if a collision is detected, it runs resolve_collision on the collision Manifold
+# resolve_collision_pairs takes in a list of collision Manifold objects and runs the narrowphase
+# registered for their shapes on them (see shapes.py)
+# if a collision is detected, it runs resolve_collision on the collision Manifold,
+# contacts with a sensor skip the response and only let the bodies know they were hit
+# returns the number of contacts that were resolved
 def resolve_collision_pairs(collision_manifolds):
+    contacts = 0
     for m in collision_manifolds:
-        if (isinstance(m.A, entities.Player) and isinstance(m.B, entities.Player)):
-            collision_handler = circle_vs_circle
-        if (isinstance(m.A, entities.Player) or isinstance(m.B, entities.Player)) \
-            and not (isinstance(m.A, entities.Player) and isinstance(m.B, entities.Player)):
-            collision_handler = aabb_vs_circle
-            if isinstance(m.A, entities.Player):
-                m.A, m.B = m.B, m.A
-        if (isinstance(m.A, entities.Wall) and isinstance(m.B, entities.Wall)):
-            collision_handler = aabb_vs_aabb
-        if collision_handler(m):
-            resolve_collision(m)
-            positional_correction(m)
+        collision_handler = shapes.handler_for(m)
+        if collision_handler is not None and collision_handler(m):
+            m.Trigger = m.A.sensor or m.B.sensor
+            if not m.Trigger:
+                resolve_collision(m)
+                positional_correction(m)
             m.A.hit_by(m.B, m.Normal)
             m.B.hit_by(m.A, m.Normal * -1)
+            contacts += 1
+    return contacts
+
+
+# find_contacts runs the narrowphase on every manifold and returns the ones that collided,
+# without resolving them, for solvers that work on all contacts at once
+# When a list is given the contacts are put in it instead of a new one, it is emptied first
+def find_contacts(collision_manifolds, contacts=None):
+    if contacts is None:
+        contacts = []
+    else:
+        contacts.clear()
+    for m in collision_manifolds:
+        collision_handler = shapes.handler_for(m)
+        if collision_handler is not None and collision_handler(m):
+            m.Trigger = m.A.sensor or m.B.sensor
+            contacts.append(m)
+    return contacts
+
+
+# find_contacts_batch runs the narrowphase for all manifolds in one numpy pass (see narrowphase.py)
+# Instead of filling in the manifolds it returns the contacts as plain arrays, for solver.Solver.solve_rows:
+# the list of bodies, the index of the first and second body of every contact into it, the (k, 2)
+# normals pointing from the first to the second, and the penetrations
+# A box and a circle come out with the box first, the same way find_contacts has them
+def find_contacts_batch(collision_manifolds):
+    bodies = []
+    index = {}
+    ia = []
+    ib = []
+    for m in collision_manifolds:
+        for obj in (m.A, m.B):
+            if obj not in index:
+                index[obj] = len(bodies)
+                bodies.append(obj)
+        ia.append(index[m.A])
+        ib.append(index[m.B])
+
+    rects = narrowphase.gather_rects(bodies)
+    kinds = narrowphase.np.array([obj.shape for obj in bodies])
+    ia, ib, hit, penetration, normal = narrowphase.collide(rects, kinds, ia, ib)
+    return bodies, ia[hit], ib[hit], normal[hit], penetration[hit]
+
+
+# resolve_collision_pairs_batch does the same as resolve_collision_pairs, but runs the narrowphase
+# for all manifolds in one numpy pass (see narrowphase.py) before resolving the ones that hit
+# All contacts are found from the positions at the start of the pass
+# The normals handed to hit_by are only valid during the call
+def resolve_collision_pairs_batch(collision_manifolds):
+    bodies, ia, ib, normals, penetrations = find_contacts_batch(collision_manifolds)
+    normal = pgm.Vector2()
+    reverse = pgm.Vector2()
+    # one manifold is filled in for each contact in turn, to resolve it with the scalar functions
+    m = Manifold(None, None)
+    for a, b, (x, y), penetration in zip(ia.tolist(), ib.tolist(), normals.tolist(), penetrations.tolist()):
+        m.reset(bodies[a], bodies[b])
+        normal.update(x, y)
+        reverse.update(-x, -y)
+        m.Normal = normal
+        m.Penetration = penetration
+        m.Trigger = m.A.sensor or m.B.sensor
+        if not m.Trigger:
+            resolve_collision(m)
+            positional_correction(m)
+        m.A.hit_by(m.B, normal)
+        m.B.hit_by(m.A, reverse)
+    return len(penetrations)
 
 
 # resolve_collision takes in a collision Manifold and resolves the collision
@@ -90,15 +199,12 @@ def aabb_vs_aabb(m: Manifold) -> bool:
     A = m.A
     B = m.B
 
-    abox = A.rect
-    bbox = B.rect
-
     # Vector from A to B
     vector = B.center - A.center
 
     # Calculate half extents along x axis for each object
-    a_extent = (abox.right - abox.left) / 2
-    b_extent = (bbox.right - bbox.left) / 2
+    a_extent = A.width / 2
+    b_extent = B.width / 2
 
     # Calculate overlap on x axis
     x_overlap = a_extent + b_extent - abs(vector.x)
@@ -106,8 +212,8 @@ def aabb_vs_aabb(m: Manifold) -> bool:
     # SAT test on x axis
     if x_overlap > 0:
         # Calculate half extents along y axis for each object
-        a_extent = (abox.bottom - abox.top) / 2
-        b_extent = (bbox.bottom - bbox.top) / 2
+        a_extent = A.height / 2
+        b_extent = B.height / 2
 
         # Calculate overlap on y axis
         y_overlap = a_extent + b_extent - abs(vector.y)
@@ -118,18 +224,18 @@ def aabb_vs_aabb(m: Manifold) -> bool:
             if x_overlap < y_overlap:
                 # Point towards B knowing that n points from A to B
                 if vector.x < 0:
-                    m.Normal = pgm.Vector2(-1, 0)
+                    m.Normal = NORMAL_LEFT
                 else:
-                    m.Normal = pgm.Vector2(1, 0)
+                    m.Normal = NORMAL_RIGHT
 
                 m.Penetration = x_overlap
                 return True
 
             # Point toward B knowing that n points from A to B
             if vector.y < 0:
-                m.Normal = pgm.Vector2(0, -1)
+                m.Normal = NORMAL_UP
             else:
-                m.Normal = pgm.Vector2(0, 1)
+                m.Normal = NORMAL_DOWN
 
             m.Penetration = y_overlap
             return True
@@ -170,7 +276,7 @@ def circle_vs_circle(m: Manifold) -> bool:
     # Circles are on same position
     # Choose random (but consistent) values
     m.Penetration = A.width/2
-    m.Normal = pgm.Vector2(1, 0)
+    m.Normal = NORMAL_RIGHT
     return True
        
 
@@ -190,8 +296,8 @@ def aabb_vs_circle(m: Manifold) -> bool:
     closest = vector.copy()
 
     # Calculate half extents along each axis
-    x_extent = (box.rect.right - box.rect.left) / 2
-    y_extent = (box.rect.bottom - box.rect.top) / 2
+    x_extent = box.width / 2
+    y_extent = box.height / 2
 
     # Clamp point to edges of the AABB
     closest.x = max(-x_extent, min(x_extent, closest.x))
@@ -223,7 +329,7 @@ def aabb_vs_circle(m: Manifold) -> bool:
     if normal.length_squared() == 0:
         normal = pgm.Vector2(0, 1)
     d = normal.length_squared()
-    r = circle.rect.width / 2
+    r = circle.width / 2
 
     # Early out of the radius is shorter than distance to closest point and
     # Circle not inside the AABB
@@ -244,3 +350,12 @@ def aabb_vs_circle(m: Manifold) -> bool:
         m.Penetration = r - d
 
     return True
+
+
+# narrowphase functions for each pair of shapes, triggers only need to know the boxes overlap
+shapes.register(shapes.AABB, shapes.AABB, aabb_vs_aabb)
+shapes.register(shapes.AABB, shapes.CIRCLE, aabb_vs_circle)
+shapes.register(shapes.CIRCLE, shapes.CIRCLE, circle_vs_circle)
+shapes.register(shapes.TRIGGER, shapes.AABB, aabb_vs_aabb)
+shapes.register(shapes.TRIGGER, shapes.CIRCLE, aabb_vs_aabb)
+shapes.register(shapes.TRIGGER, shapes.TRIGGER, aabb_vs_aabb)
@@ -0,0 +1,183 @@
+import csv
+import json
+from collections import deque
+from time import perf_counter_ns
+import pygame
+
+
+# Span class, times one phase of a frame when used in a with statement
+class Span:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.spans.append((self.name, self.start, perf_counter_ns()))
+
+
+# span handed out while the profiler is disabled, does nothing
+class NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+# Frame class, the spans and counters recorded during one frame
+class Frame:
+    def __init__(self, index, start):
+        self.index = index
+        self.start = start
+        self.end = start
+        self.spans = []
+        self.counters = {}
+
+    # time spent in each phase in ns, phases that ran more than once (one per tick) are summed
+    def phases(self):
+        totals = {}
+        for name, start, end in self.spans:
+            totals[name] = totals.get(name, 0) + end - start
+        return totals
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+
+# Profiler class that times the phases of every frame and counts what they did
+# Phases are timed with spans, counters are added up per frame
+#   with profiler.span("broadphase"):
+#       ...
+#   profiler.count("pairs", len(pairs))
+# The last history frames are kept, for the HUD and to export as CSV or as a Chrome trace
+# (chrome://tracing or ui.perfetto.dev)
+# While disabled span() returns a shared object that does nothing and count() returns at once,
+# so leaving the instrumentation in costs next to nothing
+class Profiler:
+    def __init__(self, history=120, enabled=False):
+        self.enabled = enabled
+        self.frames = deque(maxlen=history)
+        self.frame_count = 0
+        self.current = None
+        self.spans = []
+        self.counters = {}
+        self.font = None
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.current = None
+        self.spans = []
+        self.counters = {}
+
+    def span(self, name):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name)
+
+    def count(self, name, value=1):
+        if not self.enabled:
+            return
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    # set a counter instead of adding to it, for things like the number of bodies
+    def gauge(self, name, value):
+        if not self.enabled:
+            return
+        self.counters[name] = value
+
+    # close the current frame and start the next one, called once at the start of every frame
+    def frame(self):
+        if not self.enabled:
+            return
+        now = perf_counter_ns()
+        if self.current is not None:
+            self.current.end = now
+            self.frames.append(self.current)
+        self.current = Frame(self.frame_count, now)
+        self.frame_count += 1
+        self.spans = self.current.spans
+        self.counters = self.current.counters
+
+    # average and worst time (in ms) of each phase over the kept frames, and average counters
+    def summary(self):
+        phases = {}
+        counters = {}
+        for frame in self.frames:
+            for name, duration in frame.phases().items():
+                phases.setdefault(name, []).append(duration / 1e6)
+            for name, value in frame.counters.items():
+                counters[name] = counters.get(name, 0) + value
+        frames = max(len(self.frames), 1)
+        timings = {name: (sum(values) / frames, max(values)) for name, values in phases.items()}
+        return timings, {name: value / frames for name, value in counters.items()}
+
+    # how many of the kept frames took how long, in buckets of bucket_ms
+    def histogram(self, buckets=20, bucket_ms=1.0):
+        counts = [0] * buckets
+        for frame in self.frames:
+            counts[min(int(frame.duration / 1e6 / bucket_ms), buckets - 1)] += 1
+        return counts
+
+    # one row per kept frame, with the time of every phase in ms and every counter
+    def export_csv(self, path):
+        phase_names = sorted(set(name for frame in self.frames for name, _, _ in frame.spans))
+        counter_names = sorted(set(name for frame in self.frames for name in frame.counters))
+        with open(path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["frame", "total_ms"] + [name + "_ms" for name in phase_names] + counter_names)
+            for frame in self.frames:
+                phases = frame.phases()
+                writer.writerow([frame.index, frame.duration / 1e6]
+                                + [phases.get(name, 0) / 1e6 for name in phase_names]
+                                + [frame.counters.get(name, 0) for name in counter_names])
+
+    # the kept frames as Chrome trace events, a complete event per span and a counter event per frame
+    def export_chrome_trace(self, path):
+        events = []
+        for frame in self.frames:
+            events.append({"name": "frame", "ph": "X", "pid": 0, "tid": 0,
+                           "ts": frame.start / 1000, "dur": frame.duration / 1000})
+            for name, start, end in frame.spans:
+                events.append({"name": name, "ph": "X", "pid": 0, "tid": 0, "ts": start / 1000,
+                               "dur": (end - start) / 1000})
+            if frame.counters:
+                events.append({"name": "counters", "ph": "C", "pid": 0, "tid": 0, "ts": frame.start / 1000,
+                               "args": frame.counters})
+        with open(path, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+    # draw the HUD in the top left corner of the screen, returns the rect it covers
+    # phase timings and counters over the kept frames, and a histogram of the frame times
+    def draw_hud(self, screen):
+        if self.font is None:
+            pygame.font.init()
+            self.font = pygame.font.Font(None, 18)
+        timings, counters = self.summary()
+        lines = [f"{name:<12} {mean:6.2f} ms  max {worst:6.2f}" for name, (mean, worst) in timings.items()]
+        lines += [f"{name:<12} {value:8.1f}" for name, value in counters.items()]
+
+        line_height = self.font.get_linesize()
+        counts = self.histogram()
+        width = 240
+        height = line_height * len(lines) + 50
+        hud = pygame.Surface((width, height))
+        hud.fill((20, 20, 20))
+        for i, line in enumerate(lines):
+            hud.blit(self.font.render(line, True, (220, 220, 220)), (6, 4 + i * line_height))
+
+        # one bar per 1ms bucket of frame time
+        tallest = max(max(counts), 1)
+        bar_width = (width - 12) // len(counts)
+        for i, count in enumerate(counts):
+            bar = 40 * count // tallest
+            pygame.draw.rect(hud, (80, 200, 80), (6 + i * bar_width, height - 4 - bar, bar_width - 1, bar))
+
+        return screen.blit(hud, (24, 24))
@@ -0,0 +1,117 @@
+import random
+import struct
+from . import controllers, gamestate, headless, scenes
+
+# Input recordings, one controllers.Input per fixed tick, stored in a compact binary format
+#
+# The file starts with a header
+#   magic b"PGIR", format version, tick rate, random seed, tick count, length of the scene name
+#   followed by the scene name (the name of a Scene class in scenes.py) in utf-8
+# then one byte per tick with the pressed buttons as bits (see BUTTONS), except that a run of
+# idle ticks is stored as a single byte with the high bit set and the run length - 1 in the rest
+#
+# Replaying a recording runs the scene headless with the same inputs on the same ticks, so it
+# ends in exactly the same state as the session it was recorded from, only faster
+
+MAGIC = b"PGIR"
+VERSION = 1
+HEADER = struct.Struct("<4sBHIIB")
+
+# bit for each button of a controllers.Input
+BUTTONS = (("left", 1), ("right", 2), ("jump", 4), ("down", 8))
+
+RUN = 0x80
+MAX_RUN = 0x80
+
+
+# pack an Input into its byte
+def pack(input: controllers.Input):
+    byte = 0
+    for name, bit in BUTTONS:
+        if getattr(input, name):
+            byte |= bit
+    return byte
+
+
+# unpack a byte into an Input
+def unpack(byte):
+    return controllers.Input(*(bool(byte & bit) for name, bit in BUTTONS))
+
+
+# Recording class, the packed input of every tick of one scene, with what is needed to replay it
+class Recording:
+    def __init__(self, scene, seed=0, tick_rate=60, ticks=None):
+        self.scene = scene
+        self.seed = seed
+        self.tick_rate = tick_rate
+        self.ticks = bytearray(ticks or ())
+
+    def __len__(self):
+        return len(self.ticks)
+
+    # add the input of the next tick
+    def record(self, input: controllers.Input):
+        self.ticks.append(pack(input))
+
+    # the inputs of every tick
+    def inputs(self):
+        return [unpack(byte) for byte in self.ticks]
+
+    # encode the recording, idle ticks are run length encoded
+    def to_bytes(self):
+        name = self.scene.encode("utf-8")
+        data = bytearray(HEADER.pack(MAGIC, VERSION, self.tick_rate, self.seed, len(self.ticks), len(name)))
+        data += name
+        run = 0
+        for byte in self.ticks:
+            if byte == 0:
+                run += 1
+                if run == MAX_RUN:
+                    data.append(RUN | (run - 1))
+                    run = 0
+                continue
+            if run:
+                data.append(RUN | (run - 1))
+                run = 0
+            data.append(byte)
+        if run:
+            data.append(RUN | (run - 1))
+        return bytes(data)
+
+    def from_bytes(data):
+        magic, version, tick_rate, seed, count, name_length = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError("not an input recording")
+        if version != VERSION:
+            raise ValueError(f"unsupported recording version {version}")
+        offset = HEADER.size
+        scene = bytes(data[offset:offset + name_length]).decode("utf-8")
+        ticks = bytearray()
+        for byte in data[offset + name_length:]:
+            if byte & RUN:
+                ticks.extend(bytes((byte & ~RUN) + 1))
+            else:
+                ticks.append(byte)
+        if len(ticks) != count:
+            raise ValueError(f"recording has {len(ticks)} ticks, header says {count}")
+        return Recording(scene, seed, tick_rate, ticks)
+
+    def save(self, path):
+        with open(path, "wb") as file:
+            file.write(self.to_bytes())
+
+    def load(path):
+        with open(path, "rb") as file:
+            return Recording.from_bytes(file.read())
+
+
+# replay a recording headless, as fast as possible, returns the scene and the run's headless.Stats
+# A game_state can be passed in to replay with other settings, by default a headless one is made
+# with the recording's tick rate
+def replay(recording: Recording, game_state: gamestate.GameState = None):
+    if game_state is None:
+        game_state = gamestate.GameState(headless=True, tick_rate=recording.tick_rate)
+    scene = getattr(scenes, recording.scene)(game_state)
+    random.seed(recording.seed)
+    stats = headless.run(scene, recording.inputs(), len(recording))
+    return scene, stats
@@ -0,0 +1,124 @@
+# Entity ids are an index into the registry's slots in the low INDEX_BITS bits, and the generation of
+# that slot above them, so the id of a removed entity never matches the entity that reuses its slot
+INDEX_BITS = 24
+INDEX_MASK = (1 << INDEX_BITS) - 1
+
+
+def index_of(entity_id):
+    return entity_id & INDEX_MASK
+
+
+def generation_of(entity_id):
+    return entity_id >> INDEX_BITS
+
+
+# DenseList class, a list of objects where removing any object is O(1)
+# The last object is moved into the hole, so the order changes when objects are removed
+# It can be iterated, indexed and measured like a list
+class DenseList:
+    def __init__(self):
+        self.items = []
+        self.positions = {}
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __getitem__(self, i):
+        return self.items[i]
+
+    def __contains__(self, obj):
+        return obj in self.positions
+
+    def add(self, obj):
+        self.positions[obj] = len(self.items)
+        self.items.append(obj)
+
+    def remove(self, obj):
+        i = self.positions.pop(obj)
+        last = self.items.pop()
+        if last is not obj:
+            self.items[i] = last
+            self.positions[last] = i
+
+    def discard(self, obj):
+        if obj in self.positions:
+            self.remove(obj)
+
+    def clear(self):
+        self.items.clear()
+        self.positions.clear()
+
+
+# Registry class that gives every entity of a world a generational id, and keeps per type views
+# get(id) returns the entity or None once it was removed, even after its slot was reused
+# Each type in types gets a DenseList view with the entities that are instances of it
+# Removal is O(1) everywhere: a freed slot goes on a free list, and views swap-remove
+class Registry:
+    def __init__(self, types=()):
+        self.slots = []
+        self.generations = []
+        self.free = []
+        self.ids = {}
+        self.views = {cls: DenseList() for cls in types}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, entity):
+        return entity in self.ids
+
+    # the view of one of the registry's types
+    def view(self, cls):
+        return self.views[cls]
+
+    # register an entity, returns its id
+    def add(self, entity):
+        if self.free:
+            index = self.free.pop()
+            self.slots[index] = entity
+        else:
+            index = len(self.slots)
+            if index > INDEX_MASK:
+                raise OverflowError("too many entities in the registry")
+            self.slots.append(entity)
+            self.generations.append(0)
+        entity_id = self.generations[index] << INDEX_BITS | index
+        self.ids[entity] = entity_id
+        for cls, view in self.views.items():
+            if isinstance(entity, cls):
+                view.add(entity)
+        return entity_id
+
+    def remove(self, entity):
+        index = index_of(self.ids.pop(entity))
+        self.slots[index] = None
+        self.generations[index] += 1
+        self.free.append(index)
+        for cls, view in self.views.items():
+            if isinstance(entity, cls):
+                view.remove(entity)
+
+    # the id of a registered entity
+    def id_of(self, entity):
+        return self.ids[entity]
+
+    # the entity with an id, None when it was removed
+    def get(self, entity_id):
+        index = index_of(entity_id)
+        if index < len(self.slots) and self.generations[index] == generation_of(entity_id):
+            return self.slots[index]
+        return None
+
+    def clear(self):
+        # bump the generation of every slot in use, so ids handed out before stay stale
+        for entity_id in self.ids.values():
+            index = index_of(entity_id)
+            self.slots[index] = None
+            self.generations[index] += 1
+            self.free.append(index)
+        self.ids.clear()
+        for view in self.views.values():
+            view.clear()
@@ -0,0 +1,114 @@
+import pygame
+from . import spritecache, profiler
+
+
+# DirtyRenderer class, a retained-mode renderer that only redraws what changed
+# It keeps a background surface with the baked static geometry on black, and remembers
+# the rect every object was drawn at last frame
+# Each frame the old and new rects of objects that moved, appeared or disappeared are
+# restored from the background, the objects overlapping them are drawn again, and only
+# those rects are pushed to the display with pygame.display.update
+# When the dirty area covers more than threshold of the screen a full redraw and flip is cheaper
+# Objects are drawn in one batch from pre-rendered sprites, see spritecache.SpriteCache
+# An overlay (like the profiler's HUD) is drawn on top every frame, and the rect it covered is
+# restored the frame after
+# With a camera.Camera everything is drawn relative to its viewport, objects outside of it are
+# culled, and a camera that moved means a new background and a full redraw
+class DirtyRenderer:
+    def __init__(self, threshold=0.5, profile=None):
+        self.threshold = threshold
+        self.sprites = spritecache.SpriteCache()
+        self.background = None
+        self.static_version = None
+        self.offset = (0, 0)
+        self.previous = {}
+        self.overlay_rect = None
+        self.profiler = profile if profile is not None else profiler.Profiler()
+
+    # forget what is on screen, the next frame is a full redraw
+    def reset(self):
+        self.background = None
+        self.static_version = None
+        self.previous = {}
+        self.overlay_rect = None
+
+    # draw the static geometry seen from offset onto a black background
+    def build_background(self, screen, static, offset=(0, 0)):
+        self.background = pygame.Surface(screen.get_size())
+        self.background.fill((0, 0, 0))
+        static.draw(self.background, offset)
+        self.static_version = static.version
+        self.offset = offset
+
+    # redraw the whole screen from the background
+    def full_draw(self, screen, list_of_objects, headless, overlay=None):
+        with self.profiler.span("draw"):
+            screen.blit(self.background, (0, 0))
+            self.sprites.draw(screen, list_of_objects, self.offset)
+            self.profiler.count("draw_calls", len(list_of_objects) + 1)
+            self.draw_overlay(screen, overlay)
+        if not headless:
+            with self.profiler.span("present"):
+                pygame.display.flip()
+
+    # draw the overlay on top and remember where, returns its rect
+    def draw_overlay(self, screen, overlay):
+        self.overlay_rect = overlay(screen) if overlay is not None else None
+        return self.overlay_rect
+
+    # draw a frame, returns the list of rects that were updated
+    # overlay is called with the screen after everything else is drawn, and returns the rect it drew
+    def draw(self, screen, static, list_of_objects, headless=False, overlay=None, camera=None):
+        offset = camera.offset if camera is not None else (0, 0)
+        screen_rect = screen.get_rect()
+
+        # rects on the screen of the objects that can be seen
+        current = {}
+        for obj in list_of_objects:
+            rect = obj.rect.move(-offset[0], -offset[1])
+            if rect.colliderect(screen_rect):
+                current[obj] = rect
+
+        # the static geometry changed or the camera moved, start over
+        if self.background is None or self.static_version != static.version or self.offset != offset:
+            self.build_background(screen, static, offset)
+            self.previous = current
+            self.full_draw(screen, list(current), headless, overlay)
+            return [screen_rect]
+
+        dirty = []
+        for obj, rect in current.items():
+            old = self.previous.get(obj)
+            if old != rect:
+                if old is not None:
+                    dirty.append(old)
+                dirty.append(rect)
+        for obj, old in self.previous.items():
+            if obj not in current:
+                dirty.append(old)
+        if self.overlay_rect is not None:
+            dirty.append(self.overlay_rect)
+        self.previous = current
+
+        if not dirty and overlay is None:
+            return []
+
+        dirty_area = sum(rect.width * rect.height for rect in dirty)
+        if dirty_area > self.threshold * screen_rect.width * screen_rect.height:
+            self.full_draw(screen, list(current), headless, overlay)
+            return [screen_rect]
+
+        # restore the background under the dirty rects, then draw what overlaps them
+        with self.profiler.span("draw"):
+            for rect in dirty:
+                screen.blit(self.background, rect, rect)
+            redraw = [obj for obj, rect in current.items() if rect.collidelist(dirty) != -1]
+            self.sprites.draw(screen, redraw, offset)
+            self.profiler.count("draw_calls", len(dirty) + len(redraw))
+            if overlay is not None:
+                dirty.append(self.draw_overlay(screen, overlay))
+
+        if not headless:
+            with self.profiler.span("present"):
+                pygame.display.update(dirty)
+        return dirty
@@ -1,11 +1,49 @@
-from . import entities, physics, controllers, gamestate
+from . import entities, controllers, gamestate, chunks, levelfile, simthread
 from abc import ABC, abstractmethod
+import os
+import tempfile
 import pygame
 
+# compiled levels, one <Scene>.pglv file per scene, written by export_levels.py
+LEVEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "levels")
+
 class Scene(ABC):
+    # load the level from its compiled file when there is one, see load_compiled, None leaves it to
+    # the COMPILED_LEVELS option of the game state
+    use_compiled = None
+
     def __init__(self, game_state : gamestate.GameState):
         self.game_state = game_state
 
+    # path of the compiled level file of this scene
+    @classmethod
+    def level_path(cls):
+        return os.path.join(LEVEL_DIR, cls.__name__ + ".pglv")
+
+    # load the walls, goals and player of the scene from its compiled level file into the world
+    # Compiled walls are plain rects baked into the static geometry, they are not Wall objects, so
+    # they are not in the world's walls and placed walls don't merge with them, that is why loading
+    # them is opt in
+    # returns False when compiled levels are off, when there is no file, when it was written by
+    # another version of the format or of the code (the scene's setup may have changed since it was
+    # exported) or when it was made for another screen size, the scene then builds the level itself
+    def load_compiled(self):
+        use_compiled = self.use_compiled
+        if use_compiled is None:
+            use_compiled = self.game_state.COMPILED_LEVELS
+        path = self.level_path()
+        if not use_compiled or not os.path.exists(path):
+            return False
+        try:
+            level = levelfile.LevelFile(path)
+        except ValueError:
+            return False
+        with level:
+            if not level.fresh or (level.width, level.height) != (self.game_state.WIDTH, self.game_state.HEIGHT):
+                return False
+            self.player = level.load_into(self.game_state.world)
+        return True
+
     @abstractmethod
     def setup(self):
         pass
@@ -22,28 +60,38 @@ class Level_1(Scene):
     def setup(self):
         # clear all entities from the game state
         clear_entities(self.game_state)
+        if not self.load_compiled():
+            self.build()
+            # bake the walls into static geometry
+            self.game_state.world.bake()
+
+        # Create Character controller
+        self.game_state.character_controller = controllers.CharacterController(self.player)
+
+    # build the level in the world, entity by entity
+    def build(self):
+        world = self.game_state.world
 
         # add walls around the edges of the screen
-        entities.Wall(0, 0, self.game_state.WIDTH, 20, color=(50, 50, 200))
-        entities.Wall(0, 0, 20, self.game_state.HEIGHT, color=(50, 50, 200))
-        entities.Wall(self.game_state.WIDTH - 20, 0, 20, self.game_state.HEIGHT, color=(50, 50, 200))
-        entities.Wall(0, self.game_state.HEIGHT - 20, self.game_state.WIDTH, 20, color=(50, 50, 200))
+        entities.Wall(0, 0, self.game_state.WIDTH, 20, color=(50, 50, 200), world=world)
+        entities.Wall(0, 0, 20, self.game_state.HEIGHT, color=(50, 50, 200), world=world)
+        entities.Wall(self.game_state.WIDTH - 20, 0, 20, self.game_state.HEIGHT, color=(50, 50, 200), world=world)
+        entities.Wall(0, self.game_state.HEIGHT - 20, self.game_state.WIDTH, 20, color=(50, 50, 200), world=world)
 
         # make a wall that spans half the screen horizontally
-        entities.Wall(self.game_state.WIDTH // 4, self.game_state.HEIGHT // 2, self.game_state.WIDTH // 2, 20, color=(50, 50, 200))
+        entities.Wall(self.game_state.WIDTH // 4, self.game_state.HEIGHT // 2, self.game_state.WIDTH // 2, 20, color=(50, 50, 200), world=world)
 
         # make 20x20 walls in a staircase pattern
         for i in range(20):
-            entities.Wall(10 + i * 10, 10 + i * 10, 10, 10, color=(50, 50, 200))
+            entities.Wall(10 + i * 10, 10 + i * 10, 10, 10, color=(50, 50, 200), world=world)
 
         # make a Goal that is 100 px from the bottom, and 80 px from the right
-        entities.Goal(self.game_state.WIDTH - 80, self.game_state.HEIGHT - 100)
+        entities.Goal(self.game_state.WIDTH - 80, self.game_state.HEIGHT - 100, world=world)
         # make a Gola that is 100 px from the bottom, and 40 px from the left
-        entities.Goal(40, self.game_state.HEIGHT - 100)
+        entities.Goal(40, self.game_state.HEIGHT - 100, world=world)
 
-        # Create Character controller    
-        self.player = entities.Player(self.game_state.WIDTH // 2, 50, 20, 20, color=(255, 50, 50))
-        self.game_state.character_controller = controllers.CharacterController(self.player)
+        # Create the player
+        self.player = entities.Player(self.game_state.WIDTH // 2, 50, 20, 20, color=(255, 50, 50), world=world)
 
     # run the engine for this scene
     def run_engine(self):
@@ -65,23 +113,33 @@ class Level_2(Scene):
     def setup(self):
         # clear all entities from the game state
         clear_entities(self.game_state)
+        if not self.load_compiled():
+            self.build()
+            # bake the walls into static geometry
+            self.game_state.world.bake()
+
+        # Create Character controller
+        self.game_state.character_controller = controllers.CharacterController(self.player)
+
+    # build the level in the world, entity by entity
+    def build(self):
+        world = self.game_state.world
 
         # add walls around the edges of the screen
-        entities.Wall(0, 0, self.game_state.WIDTH, 20, color=(200, 200, 200))
-        entities.Wall(0, 0, 20, self.game_state.HEIGHT, color=(200, 200, 200))
-        entities.Wall(self.game_state.WIDTH - 20, 0, 20, self.game_state.HEIGHT, color=(200, 200, 200))
-        entities.Wall(0, self.game_state.HEIGHT - 20, self.game_state.WIDTH, 20, color=(200, 200, 200))
+        entities.Wall(0, 0, self.game_state.WIDTH, 20, color=(200, 200, 200), world=world)
+        entities.Wall(0, 0, 20, self.game_state.HEIGHT, color=(200, 200, 200), world=world)
+        entities.Wall(self.game_state.WIDTH - 20, 0, 20, self.game_state.HEIGHT, color=(200, 200, 200), world=world)
+        entities.Wall(0, self.game_state.HEIGHT - 20, self.game_state.WIDTH, 20, color=(200, 200, 200), world=world)
 
         # make a wall that spans half the screen horizontally
-        entities.Wall(self.game_state.WIDTH // 4, self.game_state.HEIGHT // 2, self.game_state.WIDTH // 2, 20, color=(50, 50, 0))
+        entities.Wall(self.game_state.WIDTH // 4, self.game_state.HEIGHT // 2, self.game_state.WIDTH // 2, 20, color=(50, 50, 0), world=world)
 
         # make 20x20 walls in a staircase pattern
         for i in range(20):
-            entities.Wall(10 + i * 10, 10 + i * 10, 10, 10, color=(50, 50, 200))
+            entities.Wall(10 + i * 10, 10 + i * 10, 10, 10, color=(50, 50, 200), world=world)
 
-        # Create Character controller    
-        player = entities.Player(self.game_state.WIDTH // 2, 50, 20, 20, color=(255, 50, 50))
-        self.game_state.character_controller = controllers.CharacterController(player)
+        # Create the player
+        self.player = entities.Player(self.game_state.WIDTH // 2, 50, 20, 20, color=(255, 50, 50), world=world)
 
     # run the engine for this scene
     def run_engine(self):
@@ -95,15 +153,106 @@ class Level_2(Scene):
         # determine and return the next scene
         return None
 
-# clear Wall and Physical of all entities
+# Long_Level is many screens wide, it is streamed from chunk files on disk as the camera moves,
+# see chunks.ChunkMap, the files are generated the first time it is played
+class Long_Level(Scene):
+    chunks_wide = 300
+    chunk_size = 640
+    path = os.path.join(tempfile.gettempdir(), "platformer_long_level")
+
+    def setup(self):
+        # clear all entities from the game state
+        clear_entities(self.game_state)
+        world = self.game_state.world
+
+        if not os.path.exists(chunks.ChunkMap(world, self.path).file_for((self.chunks_wide - 1, 0))):
+            chunks.write_level(self.path, self.chunks_wide, self.chunk_size, self.game_state.HEIGHT)
+
+        # Create Character controller
+        self.player = entities.Player(100, self.game_state.HEIGHT - 100, 20, 20, color=(255, 50, 50), world=world)
+        self.game_state.character_controller = controllers.CharacterController(self.player)
+
+        # the camera follows the player, and the chunks around it are loaded
+        camera = self.game_state.camera
+        camera.target = self.player
+        camera.bounds = pygame.Rect(0, 0, self.chunks_wide * self.chunk_size, self.game_state.HEIGHT)
+        self.game_state.chunks = chunks.ChunkMap(world, self.path, self.chunk_size)
+        self.game_state.chunks.keep.add(self.player)
+        update_view(self.game_state)
+
+    # run the engine for this scene
+    def run_engine(self):
+        while True and self.game_state.running:
+            basic_engine(self.game_state)
+            basic_draw(self.game_state)
+            self.game_state.clock.tick(self.game_state.FPS)
+
+    def next_scene(self):
+        return None
+
+# clear the world of all entities
 def clear_entities(game_state: gamestate.GameState):
-    entities.Wall.list_of_walls.clear()
-    entities.Physical.all_objects.clear()
+    stop_simulation(game_state)
+    game_state.world.clear()
+    game_state.renderer.reset()
+    game_state.camera.reset()
+    game_state.chunks = None
 
 def basic_engine(game_state: gamestate.GameState):
+    game_state.profiler.frame()
+
     # Process game events
-    # Set up character controller input object
-    game_state.input = controllers.Input()
+    with game_state.profiler.span("events"):
+        handle_events(game_state)
+
+    # With a simulation thread the physics runs on it, it only gets the input of the frame
+    if game_state.THREADED_SIMULATION:
+        if game_state.simulation is None:
+            start_simulation(game_state)
+        game_state.simulation.push_input(game_state.input)
+        # the simulation thread keeps the jump until a tick used it
+        game_state.input.jump = False
+        return
+
+    # Run physics Simulation, as many fixed steps as fit into the time the last frame took
+    # the character controller runs before every step, so the input can be recorded per tick
+    game_state.world.advance(game_state.clock.get_time() / 1000, lambda: apply_input(game_state, game_state.input))
+
+    # Move the camera, and stream the chunks around it
+    update_view(game_state)
+
+# run the world of the scene on a simulation thread, see simthread.SimulationThread
+# the character controller runs before every tick, and the chunks are streamed after it
+def start_simulation(game_state: gamestate.GameState):
+    after_step = None
+    if game_state.chunks is not None:
+        after_step = lambda: update_chunks(game_state, game_state.camera.rect.center)
+    game_state.simulation = simthread.SimulationThread(game_state, lambda input: apply_input(game_state, input),
+                                                       after_step)
+    game_state.simulation.start()
+
+# stop the simulation thread, if there is one, before the world is changed from the main thread
+def stop_simulation(game_state: gamestate.GameState):
+    simulation, game_state.simulation = game_state.simulation, None
+    if simulation is not None:
+        simulation.stop()
+
+# move the camera to follow its target, and load, activate and evict chunks around it
+def update_view(game_state: gamestate.GameState):
+    game_state.camera.update()
+    update_chunks(game_state, game_state.camera.rect.center)
+
+# load, activate and evict the chunks around a point
+def update_chunks(game_state: gamestate.GameState, center):
+    if game_state.chunks is not None:
+        with game_state.profiler.span("chunks"):
+            game_state.chunks.update(*center)
+
+# turn the pygame events and pressed keys into the input of the frame
+def handle_events(game_state: gamestate.GameState):
+    profile = game_state.profiler
+    # Set up character controller input object, a jump that no tick used yet is kept
+    game_state.input = controllers.Input(jump=game_state.input.jump)
 
     # Event handling (Conrols etc)
     for event in pygame.event.get():
@@ -115,14 +264,24 @@ def basic_engine(game_state: gamestate.GameState):
                 game_state.input.jump = True
             if event.key == pygame.K_ESCAPE:
                 game_state.running = False # can also quit using escape key
+            # F3 turns the profiler and its HUD on and off, F4 saves what it recorded
+            if event.key == pygame.K_F3:
+                profile.toggle()
+                game_state.renderer.reset()
+            if event.key == pygame.K_F4:
+                profile.export_csv("profile.csv")
+                profile.export_chrome_trace("profile.json")
 
         # check for mouse left click
         elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-            # get the position of the mouse
+            # get the position of the mouse in the world
             pos = pygame.mouse.get_pos()
-            # create a wall at the mouse position snapped to the nearest 20x20 grid
-            entities.Wall(pos[0] - pos[0] % 20, pos[1] - pos[1] % 20, 20, 20, color=(50, 50, 255))
-            entities.Wall.try_merge_walls()
+            pos = (pos[0] + game_state.camera.rect.x, pos[1] + game_state.camera.rect.y)
+            # the world belongs to the simulation thread while it runs
+            if game_state.simulation is not None:
+                game_state.simulation.call(place_wall, game_state, pos)
+            else:
+                place_wall(game_state, pos)
 
     # Get a list of all pressed keys
     keys = pygame.key.get_pressed()
@@ -131,34 +290,44 @@ def basic_engine(game_state: gamestate.GameState):
         game_state.input.left = True
     if keys[pygame.K_d]:
         game_state.input.right = True
-    
-    # Run character controller
-    game_state.character_controller.set_input(game_state.input)
-
-    # Run physics Simulation
-    for obj in entities.Physical.all_objects:
-        # add gravity to all objects
-        if not obj.locked:
-            obj.add_velocity(0, game_state.GRAVITY)
-        # move all objects
-        obj.step()
-        # Check for and resolve collisions
-        collision_manifolds = physics.generate_collision_pairs(entities.Physical.all_objects)
-        if len(collision_manifolds) > 0:
-            physics.resolve_collision_pairs(collision_manifolds)
 
-            
+# create a wall at a position in the world snapped to the nearest 20x20 grid
+def place_wall(game_state: gamestate.GameState, pos):
+    grid = game_state.GRID_SIZE
+    wall = entities.Wall(pos[0] - pos[0] % grid, pos[1] - pos[1] % grid, grid, grid, color=(50, 50, 255),
+                         world=game_state.world)
+    wall = entities.Wall.merge_neighbours(wall)
+    # update the baked static geometry, merging into a baked wall already did
+    if wall.baked_into is None:
+        game_state.world.bake_wall(wall)
+
+# run the character controller with an input for one tick, and record it
+def apply_input(game_state: gamestate.GameState, input: controllers.Input):
+    game_state.character_controller.set_input(input)
+    if game_state.recorder is not None:
+        game_state.recorder.record(input)
+    # a jump only lasts one tick
+    input.jump = False
 
 # draw function for the program
+# only the parts of the screen that changed are redrawn, see renderer.DirtyRenderer
+# with the profiler on, its HUD is drawn on top
+# With a simulation thread the bodies are drawn from its snapshots, in between the last two ticks,
+# and the camera follows where its target is drawn
 def basic_draw(game_state: gamestate.GameState):
-    global bullets
-
-    # Fill the screen with black
-    game_state.screen.fill((0, 0, 0))
-
-    # Draw the physics objects
-    for obj in entities.Physical.all_objects:
-        obj.draw(game_state.screen)
-
-    # Swap display buffers
-    pygame.display.flip()
\ No newline at end of file
+    overlay = game_state.profiler.draw_hud if game_state.profiler.enabled else None
+    simulation = game_state.simulation
+    if simulation is None:
+        game_state.renderer.draw(game_state.screen, game_state.world.static, game_state.world.bodies,
+                                 game_state.headless, overlay, game_state.camera)
+        return
+
+    views = simulation.view()
+    camera = game_state.camera
+    if camera.target is not None:
+        for view in views:
+            if view.body is camera.target:
+                camera.update(view.center)
+    with simulation.lock:
+        game_state.renderer.draw(game_state.screen, game_state.world.static, views,
+                                 game_state.headless, overlay, camera)
@@ -0,0 +1,40 @@
+# Shape kinds a Physical can declare, used to pick the narrowphase function for a pair
+# TRIGGER bodies are boxes that only report overlaps, they never get an impulse response
+AABB = 0
+CIRCLE = 1
+TRIGGER = 2
+
+names = ["AABB", "CIRCLE", "TRIGGER"]
+
+# dispatch[a][b] is (narrowphase function, swap) for a pair of shapes a and b
+# swap means the function expects the two bodies the other way around
+dispatch = [[None] * len(names) for _ in names]
+
+
+# add a new shape kind, returns its number
+def add_shape(name):
+    names.append(name)
+    for row in dispatch:
+        row.append(None)
+    dispatch.append([None] * len(names))
+    return len(names) - 1
+
+
+# register the narrowphase function for a pair of shapes
+# the function gets a Manifold with a body of shape_a as A and a body of shape_b as B
+def register(shape_a, shape_b, handler):
+    dispatch[shape_a][shape_b] = (handler, False)
+    if shape_a != shape_b:
+        dispatch[shape_b][shape_a] = (handler, True)
+
+
+# look up the narrowphase function for a Manifold, swapping A and B if the function wants them
+# the other way around, returns None when no function is registered for the pair
+def handler_for(m):
+    entry = dispatch[m.A.shape][m.B.shape]
+    if entry is None:
+        return None
+    handler, swap = entry
+    if swap:
+        m.A, m.B = m.B, m.A
+    return handler
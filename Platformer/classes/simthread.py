@@ -0,0 +1,173 @@
+import threading
+import time
+from collections import deque
+import pygame
+import pygame.math as pgm
+from . import controllers
+
+
+# BodyView class, how a body looked in a snapshot, drawn by the renderer in place of the body
+# It compares and hashes like the body it shows, so the renderer can tell where that body was
+# drawn last frame
+class BodyView:
+
+    __slots__ = ("body", "rect", "color", "draw_shape")
+
+    def __init__(self, body, x, y, width, height, color, draw_shape):
+        self.body = body
+        self.rect = pygame.Rect(round(x), round(y), width, height)
+        self.color = color
+        self.draw_shape = draw_shape
+
+    @property
+    def center(self):
+        return pgm.Vector2(self.rect.center)
+
+    def __eq__(self, other):
+        return self.body is getattr(other, "body", other)
+
+    def __hash__(self):
+        return id(self.body)
+
+
+# Snapshot class, the state of every body after one tick, published by the simulation thread
+# bodies maps each body to (x, y, width, height, color, draw_shape), a snapshot is never changed
+# after it is published, so the main thread can read it without a lock
+class Snapshot:
+    def __init__(self, tick, published, bodies):
+        self.tick = tick
+        self.published = published
+        self.bodies = bodies
+
+    def take(world, tick):
+        bodies = {body: (body.x, body.y, body.width, body.height, body.color, body.draw_shape)
+                  for body in world.bodies}
+        return Snapshot(tick, time.perf_counter(), bodies)
+
+
+EMPTY = Snapshot(-1, 0.0, {})
+
+
+# views of the bodies in between two snapshots, alpha 0 is previous and 1 is latest
+# bodies that are only in the latest snapshot are shown where they are
+def interpolate(previous, latest, alpha):
+    views = []
+    for body, (x, y, width, height, color, draw_shape) in latest.bodies.items():
+        before = previous.bodies.get(body)
+        if before is not None:
+            x = before[0] + (x - before[0]) * alpha
+            y = before[1] + (y - before[1]) * alpha
+        views.append(BodyView(body, x, y, width, height, color, draw_shape))
+    return views
+
+
+# SimulationThread class that runs the world of a game on its own thread at the fixed tick rate
+# The main thread only polls events, reads the keys and draws, so a slow flip no longer delays
+# the physics, and the physics no longer delays drawing
+#  - input is handed over with push_input(), through a deque (append and popleft are atomic, so
+#    neither side takes a lock), every tick uses the newest input, and a jump pushed since the last
+#    tick is never dropped even when several frames of input arrive in between
+#  - anything else that changes the world (placing a wall) is queued with call() and runs on the
+#    simulation thread before the next tick
+#  - after every tick an immutable Snapshot is published, the last two are kept (double buffered)
+#    and view() interpolates between them by how far the clock is into the next tick
+#  - an exception on the simulation thread stops it, and is raised again on the main thread by the
+#    next view(), push_input() or stop()
+# The static geometry is shared, lock is held while the simulation thread changes it (queued calls,
+# chunk streaming) and while the main thread draws it
+class SimulationThread:
+    def __init__(self, game_state, before_step=None, after_step=None):
+        self.game_state = game_state
+        self.world = game_state.world
+        self.dt = self.world.dt
+        self.before_step = before_step
+        self.after_step = after_step
+        self.inputs = deque()
+        self.calls = deque()
+        self.input = controllers.Input()
+        self.lock = threading.Lock()
+        self.snapshots = (EMPTY, Snapshot.take(self.world, 0))
+        self.ticks = 0
+        self.running = False
+        self.thread = None
+        self.error = None
+
+    def start(self):
+        # from here on the static geometry is only rebuilt while holding the lock
+        self.world.static.rebuild()
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="simulation", daemon=True)
+        self.thread.start()
+
+    # stop the thread and wait for the tick it is in to finish
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.check()
+
+    # raise the exception that stopped the simulation thread, if there was one
+    def check(self):
+        if self.error is not None:
+            raise self.error
+
+    # hand the input of a frame to the simulation, called from the main thread
+    def push_input(self, input: controllers.Input):
+        self.check()
+        self.inputs.append(controllers.Input(input.left, input.right, input.jump, input.down))
+
+    # run function(*args) on the simulation thread before the next tick
+    def call(self, function, *args):
+        self.calls.append((function, args))
+
+    # the newest input, with the jumps of every input since the last tick
+    def next_input(self):
+        jump = self.input.jump
+        while self.inputs:
+            self.input = self.inputs.popleft()
+            jump = jump or self.input.jump
+        self.input.jump = jump
+        return self.input
+
+    def run(self):
+        next_tick = time.perf_counter()
+        while self.running:
+            try:
+                self.tick()
+            except Exception as error:
+                self.error = error
+                self.running = False
+                return
+            # wait for the next tick, when more than a few ticks behind skip ahead instead of catching up
+            next_tick += self.dt
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -self.dt * self.world.max_steps:
+                next_tick = time.perf_counter()
+
+    # one fixed step of the world, then publish its snapshot
+    def tick(self):
+        if self.calls:
+            with self.lock:
+                while self.calls:
+                    function, args = self.calls.popleft()
+                    function(*args)
+                self.world.static.rebuild()
+        if self.before_step is not None:
+            self.before_step(self.next_input())
+        self.world.step(self.dt)
+        if self.after_step is not None:
+            with self.lock:
+                self.after_step()
+                self.world.static.rebuild()
+        self.ticks += 1
+        self.snapshots = (self.snapshots[1], Snapshot.take(self.world, self.ticks))
+
+    # the bodies as they are between the last two ticks at this moment, called from the main thread
+    def view(self):
+        self.check()
+        previous, latest = self.snapshots
+        alpha = min(max((time.perf_counter() - latest.published) / self.dt, 0.0), 1.0)
+        return interpolate(previous, latest, alpha)
@@ -0,0 +1,355 @@
+from itertools import repeat
+import pygame.math as pgm
+
+
+# Contact class that remembers a touching pair of bodies between steps
+# normal_impulse is the impulse accumulated along the normal during the last step,
+# used to warm start the solver the next time the pair touches
+# The rest is the row the solver works on during a step: the bodies as indices into its list of
+# bodies, their inverse masses, the bounce, the effective mass along the normal and the penetration
+class Contact:
+
+    __slots__ = ("normal_x", "normal_y", "normal_impulse", "last_seen",
+                 "a", "b", "imass_a", "imass_b", "bias", "mass", "depth")
+
+    def __init__(self):
+        self.normal_x = 0.0
+        self.normal_y = 0.0
+        self.normal_impulse = 0.0
+        self.last_seen = -1
+        self.a = 0
+        self.b = 0
+        self.imass_a = 0.0
+        self.imass_b = 0.0
+        self.bias = 0.0
+        self.mass = 0.0
+        self.depth = 0.0
+
+
+# ContactCache class, a persistent cache of contacts keyed by the pair of bodies
+# A contact that is not seen for more than lifetime steps is dropped, and kept to be handed out
+# again for the next pair that starts touching
+class ContactCache:
+    def __init__(self, lifetime=3):
+        self.lifetime = lifetime
+        self.contacts = {}
+        self.tick = 0
+        self.free = []
+        self.stale = []
+
+    def __len__(self):
+        return len(self.contacts)
+
+    def clear(self):
+        self.contacts.clear()
+        self.free.clear()
+
+    # the contact for a pair of bodies, created when the pair was not touching before
+    def get(self, A, B):
+        key = (A, B)
+        contact = self.contacts.get(key)
+        if contact is None:
+            if self.free:
+                contact = self.free.pop()
+                contact.normal_impulse = 0.0
+                contact.last_seen = -1
+            else:
+                contact = Contact()
+            self.contacts[key] = contact
+        return contact
+
+    # drop contacts that have not been seen for too long
+    def expire(self):
+        stale = self.stale
+        for key, contact in self.contacts.items():
+            if self.tick - contact.last_seen > self.lifetime:
+                stale.append(key)
+        for key in stale:
+            self.free.append(self.contacts.pop(key))
+        stale.clear()
+
+
+# Solver class, a sequential impulse solver that works on all contacts of a step together
+# Every contact is warm started with the impulse it ended the previous step with, then the
+# solver runs a number of iterations over all contacts, accumulating and clamping the impulse
+# of each one, so resting and stacked bodies settle in a few steps
+# Overlaps are pushed apart afterwards in up to position_iterations passes that track how far every
+# body has been moved, so the boxes of a stack end up resting on each other instead of sunk in
+# Locked bodies are treated as having infinite mass
+# The velocities of the bodies are read once before solving and written back once after, the
+# solver itself works on plain floats, bodies in a bodystore.BodyStore are read and written in
+# one go through its arrays
+class Solver:
+    def __init__(self, iterations=4, warm_start=1.0, percent=0.6, slop=0.5, restitution_threshold=0.5,
+                 lifetime=3, position_iterations=8):
+        self.iterations = iterations
+        # fraction of last step's impulse to start from, 0 turns warm starting off
+        self.warm_start = warm_start
+        # positional correction, only penetration deeper than slop (px) is corrected, the rects are
+        # rounded to whole pixels anyway, and a tighter slop lets resting contacts drop out between steps
+        self.percent = percent
+        self.slop = slop
+        self.position_iterations = position_iterations
+        # bodies closing slower than this (px per tick) do not bounce
+        self.restitution_threshold = restitution_threshold
+        self.cache = ContactCache(lifetime)
+        # the normals handed to hit_by, reused for every contact
+        self.normal = pgm.Vector2()
+        self.reverse = pgm.Vector2()
+        # lists that are filled again every step instead of made new: the bodies and contacts
+        # handed to solve_rows by solve, the contacts being solved, and the velocities, inverse
+        # masses and positional corrections of the bodies
+        self.bodies = []
+        self.ia = []
+        self.ib = []
+        self.normals_x = []
+        self.normals_y = []
+        self.depths = []
+        self.triggers = []
+        self.rows = []
+        self.velocities_x = []
+        self.velocities_y = []
+        self.imass = []
+        self.moves_x = []
+        self.moves_y = []
+
+    def clear(self):
+        self.cache.clear()
+        self.bodies.clear()
+        self.triggers.clear()
+
+    # solve a list of contacts (Manifolds the narrowphase found colliding), returns how many were solved
+    def solve(self, contacts):
+        bodies = self.bodies
+        ia = self.ia
+        ib = self.ib
+        normals_x = self.normals_x
+        normals_y = self.normals_y
+        depths = self.depths
+        triggers = self.triggers
+        bodies.clear()
+        ia.clear()
+        ib.clear()
+        normals_x.clear()
+        normals_y.clear()
+        depths.clear()
+        triggers.clear()
+        for m in contacts:
+            if not (m.A.alive and m.B.alive):
+                continue
+            if m.Trigger:
+                triggers.append(m)
+                continue
+            ia.append(index_of(bodies, m.A))
+            ib.append(index_of(bodies, m.B))
+            normals_x.append(m.Normal.x)
+            normals_y.append(m.Normal.y)
+            depths.append(m.Penetration)
+
+        solved = self.solve_rows(bodies, ia, ib, normals_x, normals_y, depths)
+
+        # Triggers are only reported
+        reverse = self.reverse
+        for m in triggers:
+            if m.A.alive and m.B.alive:
+                reverse.update(-m.Normal.x, -m.Normal.y)
+                m.A.hit_by(m.B, m.Normal)
+                m.B.hit_by(m.A, reverse)
+        return solved + len(triggers)
+
+    # solve contacts given as plain lists, contact k is between bodies[ia[k]] and bodies[ib[k]], with
+    # a normal pointing from the first to the second and a penetration depth
+    # returns how many contacts were solved
+    def solve_rows(self, bodies, ia, ib, normals_x, normals_y, depths):
+        cache = self.cache
+        cache.tick += 1
+        velocities_x = self.velocities_x
+        velocities_y = self.velocities_y
+        read_velocities(bodies, velocities_x, velocities_y)
+        imass = self.imass
+        imass.clear()
+        for body in bodies:
+            imass.append(0.0 if body.locked else body.imass)
+
+        # Set up every contact, then warm start it with last step's impulse
+        rows = self.rows
+        rows.clear()
+        for k in range(len(ia)):
+            a = ia[k]
+            b = ib[k]
+            imass_a = imass[a]
+            imass_b = imass[b]
+            if imass_a + imass_b == 0:
+                continue
+            A = bodies[a]
+            B = bodies[b]
+            nx = normals_x[k]
+            ny = normals_y[k]
+
+            contact = cache.get(A, B)
+            touching = contact.last_seen == cache.tick - 1 and contact.normal_x * nx + contact.normal_y * ny > 0.9
+
+            # bounce only when the bodies first hit, and fast enough, so resting contacts stay still
+            closing = (velocities_x[b] - velocities_x[a]) * nx + (velocities_y[b] - velocities_y[a]) * ny
+            bias = 0.0
+            if not touching and closing < -self.restitution_threshold:
+                bias = -min(A.restitution, B.restitution) * closing
+
+            impulse = 0.0
+            if touching:
+                impulse = contact.normal_impulse * self.warm_start
+            contact.normal_x = nx
+            contact.normal_y = ny
+            contact.normal_impulse = impulse
+            contact.last_seen = cache.tick
+            if impulse:
+                velocities_x[a] -= nx * impulse * imass_a
+                velocities_y[a] -= ny * impulse * imass_a
+                velocities_x[b] += nx * impulse * imass_b
+                velocities_y[b] += ny * impulse * imass_b
+
+            contact.a = a
+            contact.b = b
+            contact.imass_a = imass_a
+            contact.imass_b = imass_b
+            contact.bias = bias
+            contact.mass = 1 / (imass_a + imass_b)
+            contact.depth = depths[k]
+            rows.append(contact)
+
+        # Iterate, the accumulated impulse of a contact can never pull the bodies together
+        for _ in range(self.iterations):
+            for contact in rows:
+                a = contact.a
+                b = contact.b
+                nx = contact.normal_x
+                ny = contact.normal_y
+                closing = (velocities_x[b] - velocities_x[a]) * nx + (velocities_y[b] - velocities_y[a]) * ny
+                old = contact.normal_impulse
+                contact.normal_impulse = max(old + (contact.bias - closing) * contact.mass, 0.0)
+                impulse = contact.normal_impulse - old
+                if impulse:
+                    velocities_x[a] -= nx * impulse * contact.imass_a
+                    velocities_y[a] -= ny * impulse * contact.imass_a
+                    velocities_x[b] += nx * impulse * contact.imass_b
+                    velocities_y[b] += ny * impulse * contact.imass_b
+        write_velocities(bodies, imass, velocities_x, velocities_y)
+
+        # Push the bodies apart, a few passes over all contacts, each pass works on the depth that is
+        # left after the moves of the passes before it, so a correction carries through a whole stack
+        # instead of pushing the body below into the next one
+        moves_x = self.moves_x
+        moves_y = self.moves_y
+        moves_x.clear()
+        moves_y.clear()
+        moves_x.extend(repeat(0.0, len(bodies)))
+        moves_y.extend(repeat(0.0, len(bodies)))
+        for _ in range(self.position_iterations):
+            deepest = 0.0
+            for contact in rows:
+                a = contact.a
+                b = contact.b
+                nx = contact.normal_x
+                ny = contact.normal_y
+                depth = contact.depth - ((moves_x[b] - moves_x[a]) * nx + (moves_y[b] - moves_y[a]) * ny + self.slop)
+                if depth <= 0:
+                    continue
+                if depth > deepest:
+                    deepest = depth
+                correction = self.percent * depth * contact.mass
+                moves_x[a] -= nx * correction * contact.imass_a
+                moves_y[a] -= ny * correction * contact.imass_a
+                moves_x[b] += nx * correction * contact.imass_b
+                moves_y[b] += ny * correction * contact.imass_b
+            # stop once no contact is more than another slop too deep
+            if deepest <= self.slop:
+                break
+        move_bodies(bodies, imass, moves_x, moves_y)
+
+        # Then let the bodies react to the hit, the normals handed over are only valid during the call
+        normal = self.normal
+        reverse = self.reverse
+        for contact in rows:
+            A = bodies[contact.a]
+            B = bodies[contact.b]
+            if A.alive and B.alive:
+                normal.update(contact.normal_x, contact.normal_y)
+                reverse.update(-contact.normal_x, -contact.normal_y)
+                A.hit_by(B, normal)
+                B.hit_by(A, reverse)
+
+        cache.expire()
+        return len(rows)
+
+
+# the index of a body in a list of bodies, the body is added to the end when it is not in it yet
+# The index is remembered on the body, so finding it again costs no lookup
+def index_of(bodies, body):
+    index = body.solver_index
+    if index is None or index >= len(bodies) or bodies[index] is not body:
+        index = body.solver_index = len(bodies)
+        bodies.append(body)
+    return index
+
+
+# fill two lists with the velocities of a list of bodies, the rows of bodies in a BodyStore are
+# read in one go
+def read_velocities(bodies, velocities_x, velocities_y):
+    velocities_x.clear()
+    velocities_y.clear()
+    store = None
+    slots = []
+    rows = []
+    for i, body in enumerate(bodies):
+        if body._store is None:
+            velocity = body._velocity
+            velocities_x.append(velocity.x)
+            velocities_y.append(velocity.y)
+        else:
+            store = body._store
+            slots.append(i)
+            rows.append(body._index)
+            velocities_x.append(0.0)
+            velocities_y.append(0.0)
+    if rows:
+        for i, (x, y) in zip(slots, store.velocity[rows].tolist()):
+            velocities_x[i] = x
+            velocities_y[i] = y
+
+
+# write the velocities back to the bodies that can move (imass above 0)
+def write_velocities(bodies, imass, velocities_x, velocities_y):
+    store = None
+    slots = []
+    rows = []
+    for i, body in enumerate(bodies):
+        if not imass[i]:
+            continue
+        if body._store is None:
+            velocity = body._velocity
+            velocity.x = velocities_x[i]
+            velocity.y = velocities_y[i]
+        else:
+            store = body._store
+            slots.append(i)
+            rows.append(body._index)
+    if rows:
+        store.velocity[rows] = [(velocities_x[i], velocities_y[i]) for i in slots]
+
+
+# move the bodies that can move by how far the positional correction pushed them
+def move_bodies(bodies, imass, moves_x, moves_y):
+    store = None
+    slots = []
+    rows = []
+    for i, body in enumerate(bodies):
+        if not imass[i] or not (moves_x[i] or moves_y[i]):
+            continue
+        if body._store is None:
+            body.move_by(moves_x[i], moves_y[i])
+        else:
+            store = body._store
+            slots.append(i)
+            rows.append(body._index)
+    if rows:
+        store.move_rows(rows, [(moves_x[i], moves_y[i]) for i in slots])
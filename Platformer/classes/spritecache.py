@@ -0,0 +1,52 @@
+from collections import OrderedDict
+import pygame
+
+
+# SpriteCache class that pre-renders each (shape, size, color) combination once into a surface
+# and keeps the most recently used ones, evicting the least recently used when it is full
+# This way shapes like ellipses are rasterized once instead of every frame, and all objects
+# can be drawn with a single Surface.blits() call
+class SpriteCache:
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.sprites = OrderedDict()
+
+    def __len__(self):
+        return len(self.sprites)
+
+    def clear(self):
+        self.sprites.clear()
+
+    # rasterize a shape into a new surface
+    def render(self, shape, size, color):
+        if shape == "ellipse":
+            surface = pygame.Surface(size, pygame.SRCALPHA)
+            pygame.draw.ellipse(surface, color, surface.get_rect())
+        else:
+            surface = pygame.Surface(size)
+            surface.fill(color)
+        return surface
+
+    # the cached surface for a shape, size and color, rendered on first use
+    def get(self, shape, size, color):
+        key = (shape, size, tuple(color))
+        surface = self.sprites.get(key)
+        if surface is not None:
+            self.sprites.move_to_end(key)
+            return surface
+        surface = self.render(shape, size, color)
+        self.sprites[key] = surface
+        if len(self.sprites) > self.max_size:
+            self.sprites.popitem(last=False)
+        return surface
+
+    # draw a list of objects with one blits() call, offset is the world position of the top left
+    # corner of the screen
+    def draw(self, screen, list_of_objects, offset=(0, 0)):
+        batch = []
+        for obj in list_of_objects:
+            rect = obj.rect
+            if offset != (0, 0):
+                rect = rect.move(-offset[0], -offset[1])
+            batch.append((self.get(obj.draw_shape, rect.size, obj.color), rect))
+        screen.blits(batch, doreturn=False)
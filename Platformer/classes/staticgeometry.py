@@ -0,0 +1,250 @@
+import pygame
+from . import entities
+
+
+# StaticGeometry class that bakes locked walls into a prebuilt collision mesh and cached surfaces
+# The walls are drawn into cached surfaces of square tiles, and covered for collisions by
+#  - a minimal set of rectangles covering the walls on the cell grid, found by greedy meshing over a
+#    grid of cell_size px cells
+#  - one rectangle for every wall that is not on the grid
+# used for collisions instead of the walls themselves
+# The pieces are not cut at tile edges, a long floor stays one piece and bodies sliding along it
+# have no inner edge to catch on, every tile lists the pieces that overlap it
+# Baked walls are taken out of the world's bodies, so they are never tested against each other,
+# moving bodies query the tiles they overlap instead
+# Adding, removing or resizing a wall only redraws the tiles it touches, and re-meshes the cells of
+# those tiles together with the pieces that reach into them
+# Walls don't have to be Wall objects, add_rects bakes plain rects and colors (for example
+# straight from a level file, see levelfile.py), those are kept under integer keys
+class StaticGeometry:
+    def __init__(self, cell_size=10, tile_cells=32):
+        self.cell_size = cell_size
+        self.tile_size = cell_size * tile_cells
+        self.walls = {}
+        # colors of the walls that are not Wall objects, and the key the next one gets
+        self.colors = {}
+        self.next_key = 0
+        self.cells = {}
+        self.tile_walls = {}
+        # pieces of the mesh, the pieces of the walls that are off the grid by wall, and the
+        # pieces of both that overlap each tile
+        self.pieces = set()
+        self.wall_pieces = {}
+        self.tile_pieces = {}
+        self.tile_surfaces = {}
+        self.dirty_tiles = set()
+        # bumped every time a wall is added or removed, so cached drawings can tell they are stale
+        self.version = 0
+
+    # number of rectangles in the collision mesh
+    @property
+    def piece_count(self):
+        self.rebuild()
+        return len(self.pieces) + len(self.wall_pieces)
+
+    def clear(self):
+        for wall in self.walls:
+            if not isinstance(wall, int):
+                wall.baked_into = None
+        self.walls.clear()
+        self.colors.clear()
+        self.cells.clear()
+        self.tile_walls.clear()
+        self.pieces.clear()
+        self.wall_pieces.clear()
+        self.tile_pieces.clear()
+        self.tile_surfaces.clear()
+        self.dirty_tiles.clear()
+        self.version += 1
+
+    # keys of the tiles that a rect overlaps
+    def tiles_for(self, rect):
+        size = self.tile_size
+        return [(tx, ty)
+                for tx in range(rect.left // size, (rect.right - 1) // size + 1)
+                for ty in range(rect.top // size, (rect.bottom - 1) // size + 1)]
+
+    # whether a rect lies on the cell grid, only those walls can be meshed
+    def on_grid(self, rect):
+        size = self.cell_size
+        return rect.x % size == 0 and rect.y % size == 0 and rect.width % size == 0 and rect.height % size == 0
+
+    # add or remove a rect from the cell occupancy, walls can overlap so each cell keeps a count
+    def count_cells(self, rect, delta):
+        size = self.cell_size
+        for cx in range(rect.left // size, rect.right // size):
+            for cy in range(rect.top // size, rect.bottom // size):
+                count = self.cells.get((cx, cy), 0) + delta
+                if count:
+                    self.cells[(cx, cy)] = count
+                else:
+                    del self.cells[(cx, cy)]
+
+    # bake a wall into the geometry
+    def add(self, wall):
+        self.insert(wall, wall.rect.copy())
+        wall.baked_into = self
+
+    # bake plain (x, y, width, height) rects with their colors, returns the keys they got
+    def add_rects(self, rects, colors):
+        keys = range(self.next_key, self.next_key + len(rects))
+        self.next_key += len(rects)
+        for key, rect, color in zip(keys, rects, colors):
+            self.colors[key] = color
+            self.insert(key, pygame.Rect(rect))
+        return keys
+
+    def insert(self, key, rect):
+        self.walls[key] = rect
+        self.version += 1
+        if self.on_grid(rect):
+            self.count_cells(rect, 1)
+        else:
+            piece = self.wall_pieces[key] = StaticPiece(*rect)
+            self.list_piece(piece)
+        for tile in self.tiles_for(rect):
+            self.tile_walls.setdefault(tile, []).append(key)
+            self.dirty_tiles.add(tile)
+
+    # take a wall, or the key of a plain rect, out of the geometry
+    def remove(self, wall):
+        rect = self.walls.pop(wall)
+        if isinstance(wall, int):
+            del self.colors[wall]
+        else:
+            wall.baked_into = None
+        self.version += 1
+        if self.on_grid(rect):
+            self.count_cells(rect, -1)
+        else:
+            self.unlist_piece(self.wall_pieces.pop(wall))
+        for tile in self.tiles_for(rect):
+            walls = self.tile_walls[tile]
+            walls.remove(wall)
+            if not walls:
+                del self.tile_walls[tile]
+            self.dirty_tiles.add(tile)
+
+    # called when a baked wall changed its rect, for example after a merge
+    def update(self, wall):
+        self.remove(wall)
+        self.add(wall)
+
+    # add a piece to the lists of the tiles it overlaps
+    def list_piece(self, piece):
+        for tile in self.tiles_for(piece.rect):
+            self.tile_pieces.setdefault(tile, []).append(piece)
+
+    def unlist_piece(self, piece):
+        for tile in self.tiles_for(piece.rect):
+            pieces = self.tile_pieces[tile]
+            pieces.remove(piece)
+            if not pieces:
+                del self.tile_pieces[tile]
+
+    # re-mesh and redraw every tile that changed since the last rebuild
+    # The mesh pieces that reach into a changed tile are taken out, and their cells are meshed again
+    # together with the cells of the changed tiles, so pieces keep reaching across tiles
+    def rebuild(self):
+        if not self.dirty_tiles:
+            return
+        size = self.cell_size
+        tile_cells = self.tile_size // size
+        region = set()
+        for tile in self.dirty_tiles:
+            x0 = tile[0] * tile_cells
+            y0 = tile[1] * tile_cells
+            region.update(cell for cell in ((x, y) for y in range(y0, y0 + tile_cells)
+                                            for x in range(x0, x0 + tile_cells))
+                          if cell in self.cells)
+            for piece in [piece for piece in self.tile_pieces.get(tile, ()) if piece in self.pieces]:
+                rect = piece.rect
+                region.update(cell for cell in ((x, y) for y in range(rect.top // size, rect.bottom // size)
+                                                for x in range(rect.left // size, rect.right // size))
+                              if cell in self.cells)
+                self.pieces.discard(piece)
+                self.unlist_piece(piece)
+
+        for piece in self.mesh(region):
+            self.pieces.add(piece)
+            self.list_piece(piece)
+
+        for tile in self.dirty_tiles:
+            if tile in self.tile_walls:
+                self.tile_surfaces[tile] = self.draw_tile(tile)
+            else:
+                self.tile_surfaces.pop(tile, None)
+        self.dirty_tiles.clear()
+
+    # greedy meshing of a set of occupied cells into as few rectangles as possible
+    def mesh(self, cells):
+        size = self.cell_size
+        pieces = []
+        for x, y in sorted(cells, key=lambda cell: (cell[1], cell[0])):
+            if (x, y) not in cells:
+                continue
+            # grow to the right as far as possible
+            width = 1
+            while (x + width, y) in cells:
+                width += 1
+            # then grow down while the whole row below is filled
+            height = 1
+            while all((x + i, y + height) in cells for i in range(width)):
+                height += 1
+            for j in range(height):
+                for i in range(width):
+                    cells.discard((x + i, y + j))
+            pieces.append(StaticPiece(x * size, y * size, width * size, height * size))
+        return pieces
+
+    # draw the walls that overlap a tile into a surface for that tile
+    def draw_tile(self, tile):
+        surface = pygame.Surface((self.tile_size, self.tile_size), pygame.SRCALPHA)
+        offset_x = tile[0] * self.tile_size
+        offset_y = tile[1] * self.tile_size
+        for wall in self.tile_walls[tile]:
+            color = self.colors[wall] if isinstance(wall, int) else wall.color
+            pygame.draw.rect(surface, color, self.walls[wall].move(-offset_x, -offset_y))
+        return surface
+
+    # mesh rectangles that overlap a rect, a piece that overlaps several of its tiles is found once
+    # When a list is given the pieces are put in it instead of a new one, it is emptied first
+    def query(self, rect, found=None):
+        if self.dirty_tiles:
+            self.rebuild()
+        if found is None:
+            found = []
+        else:
+            found.clear()
+        size = self.tile_size
+        x0 = rect.left // size
+        x1 = (rect.right - 1) // size
+        y0 = rect.top // size
+        y1 = (rect.bottom - 1) // size
+        single = x0 == x1 and y0 == y1
+        tile_pieces = self.tile_pieces
+        for tx in range(x0, x1 + 1):
+            for ty in range(y0, y1 + 1):
+                for piece in tile_pieces.get((tx, ty), ()):
+                    if piece.rect.colliderect(rect) and (single or piece not in found):
+                        found.append(piece)
+        return found
+
+    # draw the cached surfaces of the tiles that overlap the screen, offset is the world position
+    # of the top left corner of the screen
+    def draw(self, screen, offset=(0, 0)):
+        if self.dirty_tiles:
+            self.rebuild()
+        for tile in self.tiles_for(screen.get_rect().move(offset)):
+            surface = self.tile_surfaces.get(tile)
+            if surface is not None:
+                screen.blit(surface, (tile[0] * self.tile_size - offset[0], tile[1] * self.tile_size - offset[1]))
+
+
+# StaticPiece class, one rectangle of the baked collision mesh
+# It is a Wall so the collision code treats it like one, but it is not part of any world
+class StaticPiece(entities.Wall):
+
+    __slots__ = ()
+    def __init__(self, x, y, width, height):
+        super().__init__(x, y, width, height, color=None)
@@ -0,0 +1,36 @@
+# TriggerTracker class that turns the contacts of sensor bodies into enter, stay and exit events
+# Every step it gets the sensor contacts the narrowphase found, and calls
+#  - on_trigger_enter on both bodies of a pair that was not overlapping last step
+#  - on_trigger_stay on both bodies of a pair that was already overlapping
+#  - on_trigger_exit on both bodies of a pair that stopped overlapping (or was destroyed)
+class TriggerTracker:
+    def __init__(self):
+        self.overlaps = {}
+
+    def clear(self):
+        self.overlaps.clear()
+
+    def update(self, contacts):
+        previous = self.overlaps
+        current = {}
+        for m in contacts:
+            key = (m.A, m.B)
+            if key in current or (m.B, m.A) in current:
+                continue
+            if not (m.A.alive and m.B.alive):
+                continue
+            if key in previous or (m.B, m.A) in previous:
+                current[key] = m
+                m.A.on_trigger_stay(m.B)
+                m.B.on_trigger_stay(m.A)
+            else:
+                current[key] = m
+                m.A.on_trigger_enter(m.B)
+                m.B.on_trigger_enter(m.A)
+
+        for A, B in previous:
+            if (A, B) not in current and (B, A) not in current:
+                A.on_trigger_exit(B)
+                B.on_trigger_exit(A)
+
+        self.overlaps = current
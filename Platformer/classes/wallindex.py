@@ -0,0 +1,150 @@
+import random
+
+# levels of the skip lists, enough for far more walls than a level has
+MAX_LEVELS = 24
+# picks the level of new nodes, the results don't depend on it, only the speed does
+_random = random.Random(6)
+
+
+# node of a SortedRun, next holds the following node on each of its levels
+class _Node:
+
+    __slots__ = ("key", "wall", "next")
+
+    def __init__(self, key, wall, levels):
+        self.key = key
+        self.wall = wall
+        self.next = [None] * levels
+
+
+# SortedRun class that keeps walls sorted by one of their edges, so a wall with a given
+# edge value can be found quickly
+# It is a skip list, every node is on level 0 and on each level above with a chance of one half,
+# so adding, removing and finding a wall take O(log n) on average, walls with the same key are
+# kept in the order they were added
+class SortedRun:
+    def __init__(self):
+        self.head = _Node(None, None, MAX_LEVELS)
+        self.levels = 1
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    # the last node on each level with a key below key, or at most key when after is True
+    def path(self, key, after=False):
+        path = [None] * self.levels
+        node = self.head
+        for level in range(self.levels - 1, -1, -1):
+            following = node.next[level]
+            while following is not None and (following.key < key or after and following.key == key):
+                node = following
+                following = node.next[level]
+            path[level] = node
+        return path
+
+    def add(self, key, wall):
+        levels = 1
+        while levels < MAX_LEVELS and _random.random() < 0.5:
+            levels += 1
+        path = self.path(key, after=True)
+        if levels > self.levels:
+            path += [self.head] * (levels - self.levels)
+            self.levels = levels
+        node = _Node(key, wall, levels)
+        for level in range(levels):
+            node.next[level] = path[level].next[level]
+            path[level].next[level] = node
+        self.count += 1
+
+    def remove(self, key, wall):
+        path = self.path(key)
+        # the node of the wall, among the nodes with the same key
+        node = path[0].next[0]
+        while node.wall is not wall:
+            node = node.next[0]
+        for level in range(len(node.next)):
+            previous = path[level]
+            while previous.next[level] is not node:
+                previous = previous.next[level]
+            previous.next[level] = node.next[level]
+        while self.levels > 1 and self.head.next[self.levels - 1] is None:
+            self.levels -= 1
+        self.count -= 1
+
+    # first wall with an edge at key that wall can merge with, another wall with the same owner
+    def find(self, key, wall):
+        node = self.path(key)[0].next[0]
+        while node is not None and node.key == key:
+            if node.wall is not wall and node.wall.owner is wall.owner:
+                return node.wall
+            node = node.next[0]
+        return None
+
+
+# WallIndex class that indexes walls by column (x, width) and by row (y, height)
+# Inside a column walls are sorted by their top and bottom edges, inside a row by their
+# left and right edges, so the walls that touch a wall end to end are found in O(log n)
+# Only walls with the same owner as the wall are found, see entities.Wall
+class WallIndex:
+    def __init__(self):
+        self.columns = {}
+        self.rows = {}
+
+    def clear(self):
+        self.columns.clear()
+        self.rows.clear()
+
+    # the sorted runs for a column or row, created on first use
+    def runs(self, table, key):
+        runs = table.get(key)
+        if runs is None:
+            runs = table[key] = (SortedRun(), SortedRun())
+        return runs
+
+    def add(self, wall):
+        rect = wall.rect
+        starts, ends = self.runs(self.columns, (rect.x, rect.width))
+        starts.add(rect.top, wall)
+        ends.add(rect.bottom, wall)
+        starts, ends = self.runs(self.rows, (rect.y, rect.height))
+        starts.add(rect.left, wall)
+        ends.add(rect.right, wall)
+
+    # remove a wall, rect has to be the rect the wall had when it was added
+    def remove(self, wall, rect=None):
+        if rect is None:
+            rect = wall.rect
+        for table, key, start, end in ((self.columns, (rect.x, rect.width), rect.top, rect.bottom),
+                                       (self.rows, (rect.y, rect.height), rect.left, rect.right)):
+            starts, ends = table[key]
+            starts.remove(start, wall)
+            ends.remove(end, wall)
+            if not starts:
+                del table[key]
+
+    # the walls with the same x and width directly above or below a wall
+    def above(self, wall):
+        rect = wall.rect
+        runs = self.columns.get((rect.x, rect.width))
+        return runs[1].find(rect.top, wall) if runs else None
+
+    def below(self, wall):
+        rect = wall.rect
+        runs = self.columns.get((rect.x, rect.width))
+        return runs[0].find(rect.bottom, wall) if runs else None
+
+    # the walls with the same y and height directly left or right of a wall
+    def left_of(self, wall):
+        rect = wall.rect
+        runs = self.rows.get((rect.y, rect.height))
+        return runs[1].find(rect.left, wall) if runs else None
+
+    def right_of(self, wall):
+        rect = wall.rect
+        runs = self.rows.get((rect.y, rect.height))
+        return runs[0].find(rect.right, wall) if runs else None
+
+    # the first wall that touches a wall end to end, vertical neighbours first
+    def neighbour(self, wall):
+        return self.above(wall) or self.below(wall) or self.left_of(wall) or self.right_of(wall)
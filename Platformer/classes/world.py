@@ -0,0 +1,410 @@
+import pygame
+import pygame.math as pgm
+from . import entities, physics, narrowphase, broadphase, bodystore, staticgeometry, layers, triggers, ccd, wallindex, \
+    profiler, registry
+
+# velocities, gravity and damping in the game are tuned per tick at this rate
+# stepping with a different dt scales them so the motion stays the same
+REFERENCE_RATE = 60
+
+
+# World class that owns the physics bodies of a scene and steps the simulation
+# All state lives on the instance, so any number of worlds can exist side by side, objects are
+# added to the world passed to their constructor
+# The simulation runs on a fixed timestep, separate from the rate the game is drawn at
+# advance() is called once per frame with the real time that passed, and runs as many
+# fixed steps as fit into the accumulated time
+# With use_store=True the body state is kept in a numpy BodyStore and integrated in one pass
+# With batch_narrowphase=True all contacts of a step are tested in one numpy pass, once there are at
+# least narrowphase.MIN_BATCH of them, and handed to the solver as arrays
+# Bodies that move slower than sleep_velocity (px per tick) for time_to_sleep seconds, together
+# with every body they touch, fall asleep and are skipped until something wakes them
+# Contacts are solved by a warm-started iterative solver (solver.Solver) when one is given,
+# otherwise one at a time by physics.resolve_collision_pairs
+# Contacts with sensor bodies are never solved, they are turned into enter/stay/exit events
+# by a triggers.TriggerTracker instead
+# With ccd=True bodies that move more than ccd_threshold of their size in a step are swept against
+# the static geometry (see ccd.py), so they can't tunnel through thin walls at low tick rates
+# Every object of the world has an id from its registry.Registry, which also keeps the walls, players
+# and goals, bodies are the objects that are simulated (not baked), all of them remove in O(1)
+# Objects destroyed during a step stay in the world, no longer alive, until the step is over
+class World:
+    def __init__(self, gravity=0.25, tick_rate=60, max_steps=5, backend=None, use_store=False,
+                 batch_narrowphase=False, allow_sleep=True, sleep_velocity=0.5, time_to_sleep=0.5,
+                 solver=None, ccd=True, ccd_threshold=0.5, max_substeps=4, profile=None):
+        self.registry = registry.Registry((entities.Wall, entities.Player, entities.Goal))
+        self.bodies = registry.DenseList()
+        # bodies that are asleep, see update_sleep
+        self.sleeping = set()
+        # walls of the world, indexed by column and row to find the walls a wall can merge with
+        self.walls = self.registry.view(entities.Wall)
+        self.wall_index = wallindex.WallIndex()
+        self.players = self.registry.view(entities.Player)
+        self.goals = self.registry.view(entities.Goal)
+        # objects destroyed during the step that is running, removed when it is over
+        self.stepping = False
+        self.destroyed = []
+        # objects of the last scene, reused by the next one, see entities.EntityPool
+        self.pool = entities.EntityPool()
+        # manifolds handed out during a step, all taken back at the start of the next one
+        self.manifolds = physics.ManifoldPool()
+        self.store = bodystore.BodyStore() if use_store else None
+        self.gravity = gravity
+        self.dt = 1 / tick_rate
+        self.max_steps = max_steps
+        self.broadphase = backend if backend is not None else broadphase.SpatialHash(cell_size=20)
+        # locked walls baked into a static collision mesh, see bake()
+        self.static = staticgeometry.StaticGeometry()
+        # the area around a body and the pieces found in it, reused for every body
+        self.area = pygame.Rect(0, 0, 0, 0)
+        self.nearby = []
+        # the rect a fast body sweeps through and the normal handed to it when it hits something,
+        # reused for every sweep
+        self.swept = pygame.Rect(0, 0, 0, 0)
+        self.reverse = pgm.Vector2()
+        # the manifolds of a step, split into solid and sensor ones, and the contacts found in them,
+        # emptied and filled again every step
+        self.collision_manifolds = []
+        self.solid = []
+        self.sensed = []
+        self.contacts = []
+        self.batch_narrowphase = batch_narrowphase
+        self.solver = solver
+        self.triggers = triggers.TriggerTracker()
+        self.ccd = ccd
+        self.ccd_threshold = ccd_threshold
+        self.max_substeps = max_substeps
+        # profiler.Profiler the phases of a step are timed with
+        self.profiler = profile if profile is not None else profiler.Profiler()
+        self.allow_sleep = allow_sleep
+        self.sleep_velocity = sleep_velocity
+        self.time_to_sleep = time_to_sleep
+        self.accumulator = 0.0
+        self.ticks = 0
+        # counters for the last step
+        self.pairs_tested = 0
+        self.contacts_resolved = 0
+
+    # remove all bodies and cached state, called when a scene is set up
+    # The bodies and walls are kept in the pool, for the next scene to reuse
+    def clear(self):
+        if self.store is not None:
+            self.store.clear()
+        for entity in self.registry.ids:
+            self.pool.release(entity)
+        self.registry.clear()
+        self.bodies.clear()
+        self.sleeping.clear()
+        self.wall_index.clear()
+        self.destroyed.clear()
+        self.broadphase.clear()
+        self.static.clear()
+        if self.solver is not None:
+            self.solver.clear()
+        self.triggers.clear()
+        self.collision_manifolds.clear()
+        self.solid.clear()
+        self.sensed.clear()
+        self.contacts.clear()
+        self.nearby.clear()
+        self.accumulator = 0.0
+        self.ticks = 0
+
+    # add an object to the world, called by Physical when it is made with this world
+    def add(self, body):
+        body.world = self
+        body.entity_id = self.registry.add(body)
+        self.bodies.add(body)
+        if self.store is not None:
+            self.store.add(body)
+
+    # take an object out of the world
+    def remove(self, body):
+        self.registry.remove(body)
+        body.entity_id = None
+        self.sleeping.discard(body)
+        if body.baked_into is not None:
+            body.baked_into.remove(body)
+        else:
+            self.bodies.remove(body)
+        if body._store is not None:
+            body._store.remove(body)
+
+    # take a destroyed object out of the world, at the end of the step when one is running
+    def destroy(self, body):
+        if self.stepping:
+            self.destroyed.append(body)
+        elif body in self.registry:
+            self.remove(body)
+
+    # the object with an id, None when it is no longer in the world
+    def get(self, entity_id):
+        return self.registry.get(entity_id)
+
+    # move every locked wall out of the bodies and into the static geometry, called once a level is built
+    # Baked walls are no longer tested against each other or drawn one by one
+    # The other bodies keep their order
+    def bake(self):
+        bodies = list(self.bodies)
+        self.bodies.clear()
+        for body in bodies:
+            if isinstance(body, entities.Wall) and body.locked:
+                self.static.add(body)
+                if body._store is not None:
+                    body._store.remove(body)
+            else:
+                self.bodies.add(body)
+        self.static.rebuild()
+
+    # bake a single wall that was added after the level was baked
+    def bake_wall(self, wall):
+        self.bodies.remove(wall)
+        self.static.add(wall)
+        if wall._store is not None:
+            wall._store.remove(wall)
+
+    # run as many fixed steps as fit into the elapsed time (in seconds), returns the number of steps
+    # Time above max_steps worth of steps is dropped, so a long stall does not snowball
+    # before_step is called before every step, to apply input once per tick
+    def advance(self, elapsed, before_step=None):
+        self.accumulator = min(self.accumulator + elapsed, self.dt * self.max_steps)
+        steps = 0
+        while self.accumulator >= self.dt:
+            if before_step is not None:
+                before_step()
+            self.step(self.dt)
+            self.accumulator -= self.dt
+            steps += 1
+        return steps
+
+    # fraction of a step left in the accumulator, used to interpolate between the last two steps
+    @property
+    def alpha(self):
+        return self.accumulator / self.dt
+
+    # advance the simulation by dt seconds
+    # integrate all bodies first, then build the contacts once and solve them
+    def step(self, dt=None):
+        if dt is None:
+            dt = self.dt
+        scale = dt * REFERENCE_RATE
+        profile = self.profiler
+        profile.gauge("bodies", len(self.bodies))
+        self.stepping = True
+
+        # Integrate, fast bodies are swept instead
+        with profile.span("integrate"):
+            self.integrate(scale)
+
+        # Check for and resolve collisions, the static geometry is on the WORLD layer
+        with profile.span("broadphase"):
+            manifolds = self.manifolds
+            manifolds.release_all()
+            collision_manifolds = self.collision_manifolds
+            collision_manifolds.clear()
+            area = self.area
+            nearby = self.nearby
+            for body in self.bodies:
+                if not body.resting and body.mask & layers.WORLD:
+                    area.update(body.rect)
+                    area.inflate_ip(2 * broadphase.MARGIN, 2 * broadphase.MARGIN)
+                    for piece in self.static.query(area, nearby):
+                        collision_manifolds.append(manifolds.acquire(piece, body))
+            physics.generate_collision_pairs(self.bodies, self.broadphase, manifolds, collision_manifolds)
+            self.wake_touched(collision_manifolds)
+        self.pairs_tested = len(collision_manifolds)
+        profile.count("pairs", self.pairs_tested)
+
+        # Sensors only report overlaps
+        solid = self.solid
+        sensed = self.sensed
+        solid.clear()
+        sensed.clear()
+        for m in collision_manifolds:
+            if m.A.sensor or m.B.sensor:
+                sensed.append(m)
+            else:
+                solid.append(m)
+
+        self.contacts_resolved = 0
+        # small steps are not worth a numpy pass
+        batch = self.batch_narrowphase and len(solid) >= narrowphase.MIN_BATCH
+        if self.solver is not None and batch:
+            with profile.span("narrowphase"):
+                bodies, ia, ib, normals, penetrations = physics.find_contacts_batch(solid)
+            profile.count("contacts", len(penetrations))
+            with profile.span("solve"):
+                self.contacts_resolved = self.solver.solve_rows(bodies, ia.tolist(), ib.tolist(),
+                                                                normals[:, 0].tolist(), normals[:, 1].tolist(),
+                                                                penetrations.tolist())
+        elif self.solver is not None:
+            with profile.span("narrowphase"):
+                contacts = physics.find_contacts(solid, self.contacts)
+            profile.count("contacts", len(contacts))
+            with profile.span("solve"):
+                self.contacts_resolved = self.solver.solve(contacts)
+        elif len(solid) > 0:
+            with profile.span("resolve"):
+                if batch:
+                    self.contacts_resolved = physics.resolve_collision_pairs_batch(solid)
+                else:
+                    self.contacts_resolved = physics.resolve_collision_pairs(solid)
+            profile.count("contacts", self.contacts_resolved)
+        with profile.span("triggers"):
+            self.triggers.update(physics.find_contacts(sensed, self.contacts))
+
+        if self.allow_sleep:
+            with profile.span("sleep"):
+                self.update_sleep(collision_manifolds, dt)
+
+        # Take out what was destroyed during the step
+        self.stepping = False
+        for body in self.destroyed:
+            if body in self.registry:
+                self.remove(body)
+        self.destroyed.clear()
+
+        self.ticks += 1
+
+    # apply gravity and move every body that is not resting, fast bodies are swept
+    def integrate(self, scale):
+        if self.store is not None:
+            fast = self.store.fast(self.gravity, scale, self.ccd_threshold) if self.ccd else None
+            self.store.integrate(self.gravity, scale, skip=fast)
+            if fast is not None:
+                for index in fast.nonzero()[0]:
+                    body = self.store.bodies[index]
+                    body.add_velocity(0, self.gravity * scale)
+                    self.sweep(body, scale)
+        else:
+            for body in self.bodies:
+                if not body.resting:
+                    body.add_velocity(0, self.gravity * scale)
+                    velocity = body.velocity
+                    if self.ccd and ccd.is_fast(body, velocity.x * scale, velocity.y * scale, self.ccd_threshold):
+                        self.sweep(body, scale)
+                    else:
+                        body.step(scale)
+
+    # move a fast body by its velocity, stopping at the first static piece in the way each sub-step
+    # On a hit the velocity into the surface is taken out (and bounced back by the restitution)
+    # and the body carries on with what is left of the step
+    def sweep(self, body, scale):
+        velocity = body.velocity
+        vx = velocity.x
+        vy = velocity.y
+        x = body.x
+        y = body.y
+        swept = self.swept
+        remaining = 1.0
+        for _ in range(self.max_substeps):
+            dx = vx * scale * remaining
+            dy = vy * scale * remaining
+            # the rect covering the body at the start and at the end of the move, grown by a pixel
+            left = round(x)
+            top = round(y)
+            moved_left = left + round(dx)
+            moved_top = top + round(dy)
+            swept.update(min(left, moved_left) - 1, min(top, moved_top) - 1,
+                         abs(moved_left - left) + body.width + 2, abs(moved_top - top) + body.height + 2)
+
+            first = None
+            first_piece = None
+            if body.mask & layers.WORLD:
+                for piece in self.static.query(swept, self.nearby):
+                    hit = ccd.time_of_impact(body, x, y, dx, dy, piece.rect)
+                    if hit is not None and (first is None or hit[0] < first[0]):
+                        first = hit
+                        first_piece = piece
+            if first is None:
+                x += dx
+                y += dy
+                break
+
+            t, normal = first
+            x += dx * t
+            y += dy * t
+            into = vx * normal.x + vy * normal.y
+            if into < 0:
+                bounce = into * (1 + min(body.restitution, first_piece.restitution))
+                vx -= normal.x * bounce
+                vy -= normal.y * bounce
+            reverse = self.reverse
+            reverse.update(-normal.x, -normal.y)
+            body.hit_by(first_piece, reverse)
+            first_piece.hit_by(body, normal)
+            remaining *= 1 - t
+            if remaining <= 0:
+                break
+
+        body.move_to(x, y)
+        velocity = body.velocity
+        velocity.update(vx * 0.8 ** scale, vy)
+        body.velocity = velocity
+
+    # wake the sleeping bodies that a moving body touches, with the rest of their island
+    def wake_touched(self, collision_manifolds):
+        for m in collision_manifolds:
+            if m.A.sleeping and not m.B.resting:
+                m.A.wake()
+            elif m.B.sleeping and not m.A.resting:
+                m.B.wake()
+
+    # put islands of slow bodies to sleep
+    # An island is a group of moving bodies that touch each other, it only falls asleep when
+    # every body in it has been slow for time_to_sleep, and wakes up as a whole
+    # The islands are found with a union find over the island_root of the bodies, and the time the
+    # bodies of an island have all been slow for is gathered in the island_time of its root, so
+    # nothing is allocated unless an island falls asleep
+    def update_sleep(self, collision_manifolds, dt):
+        limit = self.sleep_velocity ** 2
+        # the speeds of the bodies in the store are worked out for all rows at once
+        speeds = None
+        if self.store is not None:
+            velocity = self.store.velocity[:self.store.count]
+            speeds = (velocity * velocity).sum(axis=1).tolist()
+        for body in self.bodies:
+            if body.resting:
+                body.island_root = None
+                continue
+            body.island_root = body
+            if body._store is not None:
+                speed = speeds[body._index]
+            else:
+                speed = body.velocity.length_squared()
+            if speed < limit:
+                body.sleep_time += dt
+            else:
+                body.sleep_time = 0.0
+            body.island_time = body.sleep_time
+
+        for m in collision_manifolds:
+            if m.A.island_root is not None and m.B.island_root is not None:
+                find_root(m.A).island_root = find_root(m.B)
+
+        for body in self.bodies:
+            if body.island_root is not None:
+                root = find_root(body)
+                if body.sleep_time < root.island_time:
+                    root.island_time = body.sleep_time
+
+        islands = None
+        for body in self.bodies:
+            if body.island_root is not None:
+                root = find_root(body)
+                if root.island_time >= self.time_to_sleep:
+                    if islands is None:
+                        islands = {}
+                    islands.setdefault(root, []).append(body)
+        if islands is not None:
+            for island in islands.values():
+                for body in island:
+                    body.sleep(island)
+
+
+# the root of a body's island, see World.update_sleep, halving the path as it goes
+def find_root(body):
+    while body.island_root is not body:
+        body.island_root = body.island_root.island_root
+        body = body.island_root
+    return body
@@ -0,0 +1,36 @@
+import argparse
+import os
+import time
+from classes import levelfile, scenes
+
+
+# compile the levels of the scenes into level files, which the scenes then load instead of
+# building the level entity by entity when compiled levels are on (game.py --compiled)
+def main():
+    parser = argparse.ArgumentParser(description="Compile scenes into level files")
+    parser.add_argument("scenes", nargs="*", default=["Level_1", "Level_2"], help="names of Scene classes")
+    args = parser.parse_args()
+
+    os.makedirs(scenes.LEVEL_DIR, exist_ok=True)
+    print(f"{'scene':<12}{'entities':>10}{'bytes':>10}{'build ms':>10}{'load ms':>10}")
+    for name in args.scenes:
+        scene_class = getattr(scenes, name)
+        path = scene_class.level_path()
+        count = levelfile.export(scene_class, path)
+        build = time_setup(scene_class, compiled=False)
+        load = time_setup(scene_class, compiled=True)
+        print(f"{name:<12}{count:>10}{os.path.getsize(path):>10}{build:>10.2f}{load:>10.2f}")
+
+
+# average time of a scene's setup in ms
+def time_setup(scene_class, compiled, runs=20):
+    scene = scene_class(scenes.gamestate.GameState(headless=True))
+    scene.use_compiled = compiled
+    start = time.perf_counter()
+    for _ in range(runs):
+        scene.setup()
+    return (time.perf_counter() - start) / runs * 1000
+
+
+if __name__ == "__main__":
+    main()
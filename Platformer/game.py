@@ -1,16 +1,31 @@
+import argparse
+import os
+import random
 import pygame
 import sys
-from classes import gamestate, scenes
+from classes import gamestate, scenes, recording
 
 
 # Main game loop
-def game_loop(game_state: gamestate.GameState, current_scene: scenes.Scene):
+# with record_to set, the input of every scene is saved there, see recording.py
+def game_loop(game_state: gamestate.GameState, current_scene: scenes.Scene, record_to=None):
+    count = 0
     while game_state.running:
         # Setup current scene
+        seed = random.randrange(2 ** 32)
+        random.seed(seed)
         current_scene.setup()
+        if record_to is not None:
+            game_state.recorder = recording.Recording(type(current_scene).__name__, seed, game_state.TICK_RATE)
 
         # Process game events
         current_scene.run_engine()
+        scenes.stop_simulation(game_state)
+
+        # Save what was recorded
+        if record_to is not None:
+            count += 1
+            game_state.recorder.save(os.path.join(record_to, f"{count}_{type(current_scene).__name__}.pgir"))
 
         # Determine the next scene
         current_scene = current_scene.next_scene()
@@ -22,15 +37,23 @@ def game_loop(game_state: gamestate.GameState, current_scene: scenes.Scene):
 
 # main function for the program
 def main():
+    parser = argparse.ArgumentParser(description="Play the platformer")
+    parser.add_argument("--record", metavar="DIR", help="save the input of every scene to this directory")
+    parser.add_argument("--scene", default="Level_1", help="scene to start on, for example Long_Level")
+    parser.add_argument("--compiled", action="store_true",
+                        help="load the scenes from the level files export_levels.py wrote, when they are up to date")
+    args = parser.parse_args()
+    if args.record is not None:
+        os.makedirs(args.record, exist_ok=True)
 
     # create game state object at start of program
-    game_state = gamestate.GameState()
+    game_state = gamestate.GameState(compiled_levels=args.compiled)
 
     # Choose a scene to start on
-    initial_scene = scenes.Level_1(game_state)
+    initial_scene = getattr(scenes, args.scene)(game_state)
 
     # run game loop function, pass game state object as parameter/argument
-    game_loop(game_state, initial_scene)
+    game_loop(game_state, initial_scene, args.record)
 
     # Quit Pygame
     pygame.quit()
@@ -0,0 +1,22 @@
+import argparse
+from classes import recording
+
+
+# replay input recordings made with game.py --record, without a display and as fast as possible,
+# and print how each one ended and how fast it ran
+def main():
+    parser = argparse.ArgumentParser(description="Replay input recordings headless")
+    parser.add_argument("paths", nargs="+", help="recordings made with game.py --record")
+    args = parser.parse_args()
+
+    print(f"{'recording':<30}{'ticks':>8}{'x speedup':>12}{'score':>8}  final position")
+    for path in args.paths:
+        rec = recording.Recording.load(path)
+        scene, stats = recording.replay(rec)
+        player = scene.player
+        speedup = stats.ticks_per_second / rec.tick_rate
+        print(f"{path:<30}{len(rec):>8}{speedup:>12.1f}{player.score:>8}  ({player.x!r}, {player.y!r})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# the tests run headless, and import the game's classes package the way the scripts next to it do
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,26 @@
+import tracemalloc
+import pytest
+import benchmark
+from classes import gamestate, headless
+
+
+# run a populated level until the pools have grown, then trace the memory a run of ticks leaves
+# allocated, once warmed up the pools, caches and scratch lists are reused, so next to nothing is
+# kept from one tick to the next
+@pytest.mark.parametrize("use_body_store", [False, True])
+def test_steady_state_keeps_next_to_nothing(use_body_store, warmup=220, ticks=600, max_bytes=2):
+    game_state = gamestate.GameState(headless=True, use_body_store=use_body_store)
+    scene = benchmark.Stress_Walls(game_state, 1000)
+    inputs = benchmark.scripted_inputs(warmup + ticks)
+    headless.run(scene, inputs[:warmup - 100], warmup - 100)
+
+    # the last ticks of the warmup are traced too, what they free was allocated before tracing started
+    tracemalloc.start()
+    try:
+        headless.run(scene, inputs[warmup - 100:warmup], 100, setup=False)
+        start, _ = tracemalloc.get_traced_memory()
+        headless.run(scene, inputs[warmup:], ticks, setup=False)
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert (current - start) / ticks <= max_bytes
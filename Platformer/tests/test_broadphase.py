@@ -0,0 +1,48 @@
+import random
+import pygame
+import pytest
+from classes import broadphase
+
+
+# the parts of an object a broadphase looks at, locked objects are resting from the start
+class Box:
+    def __init__(self, rng, locked):
+        self.rect = pygame.Rect(rng.randint(-50, 800), rng.randint(-50, 600), rng.randint(0, 300), rng.randint(0, 60))
+        self.locked = locked
+        self.resting = locked
+        self.layer = 1 << rng.randint(0, 2)
+        self.mask = rng.choice([7, 7, 3, 5, 0])
+
+
+# move the objects around for a few dozen ticks, taking some out, adding and reordering others and
+# putting some to sleep and waking them, every tick the pairs found must be the ones BruteForce finds
+@pytest.mark.parametrize("make_broadphase", [broadphase.SpatialHash, broadphase.SweepAndPrune])
+@pytest.mark.parametrize("seed", range(8))
+def test_pairs_match_brute_force(make_broadphase, seed):
+    rng = random.Random(seed)
+    objects = [Box(rng, rng.random() < 0.7) for _ in range(200)]
+    tested = make_broadphase()
+    reference = broadphase.BruteForce()
+    previous = set()
+    for tick in range(40):
+        for obj in objects:
+            if not obj.resting:
+                obj.rect.move_ip(rng.randint(-8, 8), rng.randint(-8, 8))
+        if tick == 10:
+            del objects[5:40]
+        if tick == 15:
+            objects[0].rect.width += 50
+        if tick == 20:
+            objects += [Box(rng, False) for _ in range(30)]
+        if tick == 25:
+            rng.shuffle(objects)
+        if tick == 30:
+            for obj in objects[:20]:
+                obj.resting = not obj.resting
+
+        assert tested.find_pairs(objects) == reference.find_pairs(objects)
+        if isinstance(tested, broadphase.SweepAndPrune):
+            pairs = set(tested.pairs)
+            assert set(tested.began) == pairs - previous
+            assert set(tested.ended) == previous - pairs
+            previous = pairs
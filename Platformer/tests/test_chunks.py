@@ -0,0 +1,59 @@
+import json
+import os
+from classes import gamestate, scenes, chunks, entities
+
+
+
+# a chunked level of a few chunks in a temporary directory, streamed around x
+def chunked_level(tmp_path, x, chunks_wide=8):
+    game_state = gamestate.GameState(headless=True)
+    chunks.write_level(str(tmp_path), chunks_wide, 640, game_state.HEIGHT)
+    chunk_map = chunks.ChunkMap(game_state.world, str(tmp_path), 640)
+    chunk_map.update(x, 300)
+    return game_state, chunk_map
+
+
+# the rects of the live walls of a world
+def wall_rects(world):
+    return sorted(tuple(wall.rect) for wall in world.walls if wall.alive)
+
+
+# placed walls that fill a floor gap don't merge into the chunk's floor, so evicting the chunk and
+# loading it again gives back the same walls, and the placed ones stay
+def test_evict_after_placed_walls_merge(tmp_path):
+    game_state, chunk_map = chunked_level(tmp_path, 2080)
+    world = game_state.world
+    floor = [wall for wall in chunk_map.chunks[(3, 0)].walls if wall.rect.y == game_state.HEIGHT - 20]
+    gap_left = floor[0].rect.right
+    scenes.place_wall(game_state, (gap_left + 5, game_state.HEIGHT - 15))
+    scenes.place_wall(game_state, (gap_left + 25, game_state.HEIGHT - 15))
+    placed = [wall for wall in world.walls if wall.owner is None]
+    assert [tuple(wall.rect) for wall in placed] == [(gap_left, game_state.HEIGHT - 20, 40, 20)]
+    before = wall_rects(world)
+
+    chunk_map.evict((3, 0))
+    assert all(wall.alive for wall in placed)
+    assert tuple(placed[0].rect) in wall_rects(world)
+
+    chunk_map.update(2080, 300)
+    assert wall_rects(world) == before
+
+
+# a wall merged into another wall of its chunk is only destroyed once when the chunk is evicted,
+# and loading the chunk again gives back the walls of its file
+def test_evict_after_chunk_walls_merge(tmp_path):
+    with open(os.path.join(tmp_path, "0_0.json"), "w") as file:
+        json.dump({"walls": [[0, 580, 100, 20, [50, 50, 200]], [100, 580, 100, 20, [50, 50, 200]]]}, file)
+    game_state = gamestate.GameState(headless=True)
+    world = game_state.world
+    chunk_map = chunks.ChunkMap(world, str(tmp_path), 640)
+    chunk_map.update(300, 300)
+    chunk = chunk_map.chunks[(0, 0)]
+    merged = entities.Wall.merge_neighbours(chunk.walls[0])
+    assert tuple(merged.rect) == (0, 580, 200, 20)
+    assert [wall.alive for wall in chunk.walls].count(False) == 1
+
+    chunk_map.evict((0, 0))
+    assert wall_rects(world) == []
+    chunk_map.update(300, 300)
+    assert wall_rects(world) == [(0, 580, 100, 20), (100, 580, 100, 20)]
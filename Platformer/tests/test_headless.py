@@ -0,0 +1,30 @@
+import benchmark
+from classes import gamestate, headless, scenes
+
+OPTIONS = dict(use_body_store=True, batch_narrowphase=True, sweep_and_prune=True)
+
+
+# a rollout builds its GameState with the physics options it is given
+def test_rollout_uses_options(monkeypatch):
+    made = []
+
+    class Recorded(gamestate.GameState):
+        def __init__(self, **options):
+            super().__init__(**options)
+            made.append(self)
+
+    monkeypatch.setattr(headless.gamestate, "GameState", Recorded)
+    headless.rollout(scenes.Level_1, benchmark.scripted_inputs(30), 30, OPTIONS)
+    game_state, = made
+    assert game_state.USE_BODY_STORE and game_state.BATCH_NARROWPHASE and game_state.SWEEP_AND_PRUNE
+
+
+# rollouts in worker processes end the same as the same rollouts run one after the other
+def test_parallel_rollouts_match_serial():
+    inputs = benchmark.scripted_inputs(120)
+    input_sequences = [inputs[seed:] + inputs[:seed] for seed in (0, 50)]
+    results = headless.run_parallel(scenes.Level_1, input_sequences, 120, 2, OPTIONS)
+    for inputs, result in zip(input_sequences, results):
+        expected = headless.rollout(scenes.Level_1, inputs, 120, OPTIONS)
+        assert (result.score, result.position, result.velocity) == \
+               (expected.score, expected.position, expected.velocity)
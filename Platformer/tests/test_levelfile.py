@@ -0,0 +1,53 @@
+import sys
+from classes import gamestate, scenes, levelfile
+
+
+# set up Level_1 with its level file in a temporary directory, returns the game state
+def setup_level(tmp_path, monkeypatch, compiled_levels):
+    monkeypatch.setattr(scenes, "LEVEL_DIR", str(tmp_path))
+    game_state = gamestate.GameState(headless=True, compiled_levels=compiled_levels)
+    scenes.Level_1(game_state).setup()
+    return game_state
+
+
+# a level file is only loaded when compiled levels are on
+def test_compiled_levels_are_opt_in(tmp_path, monkeypatch):
+    monkeypatch.setattr(scenes, "LEVEL_DIR", str(tmp_path))
+    levelfile.export(scenes.Level_1, scenes.Level_1.level_path())
+
+    built = setup_level(tmp_path, monkeypatch, compiled_levels=False)
+    assert len(built.world.walls) > 0
+    compiled = setup_level(tmp_path, monkeypatch, compiled_levels=True)
+    assert len(compiled.world.walls) == 0
+    assert sorted(compiled.world.static.walls.values()) == sorted(built.world.static.walls.values())
+
+
+# a file written by other code is stale and the scene builds the level itself
+def test_stale_level_file_is_not_loaded(tmp_path, monkeypatch):
+    monkeypatch.setattr(scenes, "LEVEL_DIR", str(tmp_path))
+    levelfile.export(scenes.Level_1, scenes.Level_1.level_path())
+    with levelfile.LevelFile(scenes.Level_1.level_path()) as level:
+        assert level.fresh
+    monkeypatch.setattr(levelfile, "_source_hash", b"\0" * 32)
+
+    game_state = setup_level(tmp_path, monkeypatch, compiled_levels=True)
+    assert len(game_state.world.walls) > 0
+
+
+# the rects are stored little endian, a big endian machine swaps them when it reads the file
+def test_rects_are_read_little_endian(tmp_path, monkeypatch):
+    path = str(tmp_path / "level.pglv")
+    levelfile.write(path, [((1, 2, 300, 40000), (10, 20, 30), levelfile.KIND_WALL)])
+    with levelfile.LevelFile(path) as level:
+        assert level.rect(0) == (1, 2, 300, 40000)
+
+    # the same file the way a machine of the other byte order sees it: rects in its own byte order,
+    # which is not the one the file is in
+    data = bytearray(open(path, "rb").read())
+    offset = levelfile.HEADER.size
+    other = "little" if sys.byteorder == "big" else "big"
+    data[offset:offset + 16] = b"".join(value.to_bytes(4, other) for value in (1, 2, 300, 40000))
+    open(path, "wb").write(data)
+    monkeypatch.setattr(levelfile.sys, "byteorder", other)
+    with levelfile.LevelFile(path) as level:
+        assert level.rect(0) == (1, 2, 300, 40000)
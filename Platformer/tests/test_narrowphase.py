@@ -0,0 +1,71 @@
+import random
+import pytest
+import benchmark
+from classes import entities, gamestate, headless, narrowphase, physics, scenes, solver, world
+
+np = pytest.importorskip("numpy")
+
+
+# random boxes at fractional positions, including some on the same spot, to hit every branch
+def random_objects(seed, count=150):
+    rng = random.Random(seed)
+    objects = []
+    for rect in [(rng.randint(0, 100), rng.randint(0, 100), rng.randint(1, 40), rng.randint(1, 40))
+                 for _ in range(count)] + [(50, 50, 20, 20), (50, 50, 20, 20), (40, 40, 40, 40)]:
+        obj = entities.Physical(*rect, color=(0, 0, 0))
+        obj.move_by(rng.random() * 3, rng.random() * 3)
+        objects.append(obj)
+    return objects
+
+
+# every batch function gives the same hits, penetrations and normals as its scalar function, bit for bit
+@pytest.mark.parametrize("name", ["aabb_vs_aabb", "circle_vs_circle", "aabb_vs_circle"])
+@pytest.mark.parametrize("seed", [1, 2])
+def test_batch_functions_match_scalar(name, seed):
+    objects = random_objects(seed)
+    rects = narrowphase.gather_rects(objects)
+    ia, ib = (np.array(indices) for indices in zip(*[(i, j) for i in range(len(objects))
+                                                     for j in range(len(objects)) if i != j]))
+    hit, penetration, normal = getattr(narrowphase, name)(rects, ia, ib)
+    for k in range(len(ia)):
+        manifold = physics.Manifold(objects[ia[k]], objects[ib[k]])
+        assert getattr(physics, name)(manifold) == hit[k]
+        if hit[k]:
+            assert manifold.Penetration == penetration[k]
+            assert (manifold.Normal.x, manifold.Normal.y) == (normal[k, 0], normal[k, 1])
+
+
+def run_scene(make_scene, use_body_store, batch_narrowphase, ticks=300):
+    game_state = gamestate.GameState(headless=True, use_body_store=use_body_store,
+                                     batch_narrowphase=batch_narrowphase)
+    headless.run(make_scene(game_state), benchmark.scripted_inputs(ticks), ticks)
+    return [(body.x, body.y, body.velocity.x, body.velocity.y) for body in game_state.world.bodies]
+
+
+# whole runs end with every body in the same place at the same speed with the batch narrowphase on or off,
+# MIN_BATCH is dropped so every step takes the batch path
+@pytest.mark.parametrize("make_scene", [scenes.Level_1, lambda game_state: benchmark.Stress_Crowd(game_state, 150)],
+                         ids=["Level_1", "crowd"])
+@pytest.mark.parametrize("use_body_store", [False, True])
+def test_batch_runs_match_scalar_runs(make_scene, use_body_store, monkeypatch):
+    monkeypatch.setattr(narrowphase, "MIN_BATCH", 0)
+    assert run_scene(make_scene, use_body_store, True) == run_scene(make_scene, use_body_store, False)
+
+
+# a pile of boxes dropped on a floor, the scenes above only have circle players
+# Only runs with a solver are compared, without one the batch path finds all contacts from the positions
+# at the start of the pass (see physics.resolve_collision_pairs_batch) while the scalar path moves the
+# bodies between pairs
+def run_boxes(batch_narrowphase, ticks=200):
+    boxes = world.World(batch_narrowphase=batch_narrowphase, solver=solver.Solver())
+    entities.Wall(0, 300, 800, 20, (0, 0, 0), world=boxes)
+    for i in range(90):
+        entities.Physical(i * 13 % 700, i * 7 % 250, 16, 16, (0, 0, 0), world=boxes)
+    for _ in range(ticks):
+        boxes.step()
+    return [(body.x, body.y, body.velocity.x, body.velocity.y) for body in boxes.bodies]
+
+
+def test_batch_box_pile_matches_scalar(monkeypatch):
+    monkeypatch.setattr(narrowphase, "MIN_BATCH", 0)
+    assert run_boxes(True) == run_boxes(False)
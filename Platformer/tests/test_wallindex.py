@@ -0,0 +1,55 @@
+import random
+import pytest
+from classes import wallindex
+
+
+# stands in for a wall, a SortedRun only looks at the owner
+class Piece:
+    def __init__(self, owner):
+        self.owner = owner
+
+
+# the (key, wall) of every node on one level of a run, in order
+def level_items(run, level):
+    items = []
+    node = run.head.next[level]
+    while node is not None:
+        items.append((node.key, node.wall))
+        node = node.next[level]
+    return items
+
+
+# add and remove walls at random with a lot of equal keys, and check the run against a plain list
+# kept sorted by key, walls with the same key in the order they were added
+# find has to give the first wall at the key with the same owner that is not the wall itself
+@pytest.mark.parametrize("seed", range(5))
+def test_sorted_run_matches_sorted_list(seed):
+    rng = random.Random(seed)
+    owners = [None, "a", "b"]
+    run = wallindex.SortedRun()
+    model = []
+    for _ in range(2000):
+        if model and rng.random() < 0.45:
+            key, wall = model.pop(rng.randrange(len(model)))
+            run.remove(key, wall)
+        else:
+            key = rng.randint(0, 30)
+            wall = Piece(rng.choice(owners))
+            run.add(key, wall)
+            position = len(model)
+            while position > 0 and model[position - 1][0] > key:
+                position -= 1
+            model.insert(position, (key, wall))
+
+        assert len(run) == len(model)
+        assert level_items(run, 0) == model
+        for level in range(1, run.levels):
+            items = level_items(run, level)
+            assert items == sorted(items, key=lambda item: item[0])
+            assert all(item in model for item in items)
+
+        key = rng.randint(0, 30)
+        wall = rng.choice(model)[1] if model and rng.random() < 0.5 else Piece(rng.choice(owners))
+        expected = next((other for other_key, other in model
+                         if other_key == key and other is not wall and other.owner is wall.owner), None)
+        assert run.find(key, wall) is expected